@@ -0,0 +1,124 @@
+# answer_cache.py
+# In-memory cache of generated answers for repeated / near-duplicate questions.
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from context_builder import question_groups
+from partitions import question_periods
+
+
+def normalize_question(question: str) -> str:
+    # "What is BHP's P/E?" and "what is bhp's p/e" should share a cache entry
+    q = question.lower().strip()
+    q = re.sub(r"\s+", " ", q)
+    return q.rstrip(" ?.!")
+
+
+@dataclass
+class _Entry:
+    answer: str
+    created: float
+    question: str
+    vector: np.ndarray | None = field(default=None, repr=False)
+
+
+class AnswerCache:
+    """LRU + TTL cache of answers keyed by (normalized question, retrieved doc ids, model, scope).
+
+    The scope is the field groups and periods the question asks about, so "BHP FY25
+    revenue" and "BHP FY25 profit" (same documents) never share an answer. With
+    `embeddings` and `similarity_threshold` set, a miss on the exact key falls back
+    to the most similar cached question with the same documents, model and scope.
+    The whole cache is dropped when the index
+    version (manifest hash) changes, so answers never outlive the data they used.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl_seconds: float = 3600,
+        embeddings=None,
+        similarity_threshold: float | None = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.index_version: str | None = None
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(question: str, doc_ids: list, model: str) -> tuple:
+        scope = tuple(question_groups(question)), tuple(question_periods(question) or ())
+        return normalize_question(question), tuple(sorted(map(str, doc_ids))), model, scope
+
+    def _check_version(self, index_version: str | None) -> None:
+        if index_version != self.index_version:
+            self._entries.clear()
+            self.index_version = index_version
+
+    def _expired(self, entry: _Entry) -> bool:
+        return time.time() - entry.created > self.ttl_seconds
+
+    def _embed(self, question: str) -> np.ndarray | None:
+        if self.embeddings is None or self.similarity_threshold is None:
+            return None
+        # Raw question, so the vector is usually already in the embedding cache from retrieval
+        v = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        return v / (np.linalg.norm(v) or 1.0)
+
+    def get(self, question: str, doc_ids: list, model: str, index_version: str | None = None) -> str | None:
+        key = self.key(question, doc_ids, model)
+        with self._lock:
+            self._check_version(index_version)
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry):
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.answer
+
+        vector = self._embed(question)
+        if vector is not None:
+            with self._lock:
+                best_key, best_sim = None, self.similarity_threshold
+                for other_key, other in self._entries.items():
+                    if other_key[1:] != key[1:] or other.vector is None or self._expired(other):
+                        continue
+                    sim = float(other.vector @ vector)
+                    if sim >= best_sim:
+                        best_key, best_sim = other_key, sim
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    self.hits += 1
+                    return self._entries[best_key].answer
+
+        self.misses += 1
+        return None
+
+    def put(self, question: str, doc_ids: list, model: str, answer: str, index_version: str | None = None) -> None:
+        key = self.key(question, doc_ids, model)
+        vector = self._embed(question)
+        with self._lock:
+            self._check_version(index_version)
+            self._entries[key] = _Entry(answer=answer, created=time.time(), question=key[0], vector=vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
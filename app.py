@@ -2,8 +2,14 @@
 import streamlit as st
 from langchain_ollama.llms import OllamaLLM
 from langchain_core.prompts import ChatPromptTemplate
-from vector import retriever, df  # builds/loads Chroma on import
-import matplotlib.pyplot as plt
+from vector import service  # lazy: nothing is loaded on import
+from answer_cache import AnswerCache
+from query_engine import QueryEngine
+from context_builder import PROMPT_TEMPLATE, ContextBuilder
+from pipeline import Pipeline, pooled_client_kwargs
+from tracing import format_breakdown, span, tracer
+from chat_history import ChatHistory
+from charts import ChartService
 
 st.set_page_config(page_title="Financial Chatbot")
 
@@ -25,86 +31,54 @@ Disclaimer: FinGenie provides company data and insights for informational purpos
 # Model + prompt (cache the chain so it’s created once)
 @st.cache_resource
 def get_chain(model_name: str = "llama3.2"):
-    model = OllamaLLM(model=model_name)
-    template = """
-You are an expert financial analyst. 
-Answer the question based on the company financial reports below.
+    # One pooled keep-alive connection set to Ollama per model
+    model = OllamaLLM(model=model_name, client_kwargs=pooled_client_kwargs())
+    prompt = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
+    return prompt | model
 
-Here are some relevant company records:{reviews}
+# Retrieval service (warmed in the background so the first frame renders immediately)
+@st.cache_resource
+def get_retrieval_service():
+    service.warm(background=True)
+    return service
 
-Here is the question to answer: {question}
+retrieval = get_retrieval_service()
 
-If the questions is not relevant to financial reports, please reply accordingly.
-"""
+# Rank / filter / aggregate questions answered straight from the DataFrame
+# (keyed on the index version, so a newly promoted snapshot gets a fresh one)
+@st.cache_resource
+def get_query_engine(index_version=None):
+    return QueryEngine(retrieval.df)
 
-    prompt = ChatPromptTemplate.from_template(template)
-    return prompt | model
+def structured_answer(question: str):
+    with span("structured"):
+        return get_query_engine(retrieval.index_version).answer(question)
 
-def format_docs(docs):
-    # Pretty print retrieved docs for the prompt
-    parts = []
-    for i, d in enumerate(docs, 1):
-        meta = d.metadata or {}
-        header = f"[Doc {i}] Company Code: {meta.get('company_code','?')} | Industry: {meta.get('industry','?')}"
-        parts.append(header + "\n" + d.page_content)
-    return "\n\n---\n\n".join(parts)
-
-
-# ---------------- Chart Function ----------------
-def plot_revenue(df, question: str, company: str = None):
-    if company:
-        data = df[df["Company name"].str.contains(company, case=False)]
-        if data.empty:
-            st.warning(f"No data found for {company}")
-            return None
-    else:
-        data = df
-
-    show_2024 = "2024" in question
-    show_2025 = "2025" in question
-    if not show_2024 and not show_2025:
-        show_2024, show_2025 = True, True
+# Bar charts from precomputed arrays, rendered PNGs memoized (see charts.py)
+@st.cache_resource
+def get_charts(index_version=None):
+    return ChartService(retrieval.df)
 
-    if show_2025 and not show_2024:
-        data = data.nlargest(5, "Revenue for full year ending Jun 25 in mn in AUD")
-    elif show_2024 and not show_2025:
-        data = data.nlargest(5, "Revenue for full year ending Jun 24 in mn in AUD")
-    else:
-        data["max_revenue"] = data[[
-            "Revenue for full year ending Jun 24 in mn in AUD",
-            "Revenue for full year ending Jun 25 in mn in AUD"
-        ]].max(axis=1)
-        data = data.nlargest(5, "max_revenue")
-
-    fig, ax = plt.subplots(figsize=(8, 5))
-    x = range(len(data))
-    width = 0.35
-
-    if show_2024:
-        ax.bar(
-            [i - width/2 if show_2025 else i for i in x],
-            data["Revenue for full year ending Jun 24 in mn in AUD"],
-            width if show_2025 else 0.6,
-            label="Revenue in 2024"
-        )
-
-    if show_2025:
-        ax.bar(
-            [i + width/2 if show_2024 else i for i in x],
-            data["Revenue for full year ending Jun 25 in mn in AUD"],
-            width if show_2024 else 0.6,
-            label="Revenue in 2025"
-        )
-
-    ax.set_xticks(list(x))
-    ax.set_xticklabels(data["Company name"], rotation=45, ha="right")
-    ax.set_ylabel("Revenue (mn AUD)")
-    ax.set_title("Full-Year Revenue")
-    ax.legend()
-    plt.tight_layout()
-    return fig
+# Question-specific, token-budgeted context from the structured company records
+@st.cache_resource
+def get_context_builder(index_version=None, max_tokens: int = 1200):
+    return ContextBuilder(retrieval.df, max_tokens=max_tokens)
 
+# Async layer shared by all sessions: at most 2 prompts on Ollama at once (the rest
+# queue), identical in-flight retrievals / generations coalesced into one call
+@st.cache_resource
+def get_pipeline(max_concurrent: int = 2):
+    return Pipeline(max_concurrent=max_concurrent)
 
+# Answers for repeated / near-duplicate questions (shared across sessions)
+@st.cache_resource
+def get_answer_cache():
+    return AnswerCache(
+        max_entries=512,
+        ttl_seconds=3600,
+        embeddings=retrieval.embeddings,
+        similarity_threshold=0.95,
+    )
 
 # Sidebar controls
 with st.sidebar:
@@ -120,7 +94,27 @@ with st.sidebar:
 
     st.subheader("Settings")
     model_name = st.text_input("Ollama model", value="llama3.2")
-    # top_k = st.slider("Retriever k", min_value=1, max_value=10, value=5)
+    status = retrieval.status()
+    if status["ready"]:
+        total = sum(status["timings"].values())
+        st.caption(f"Index ready ({total:.1f}s to load)"
+                   + (f" · snapshot {status['snapshot']}" if status["snapshot"] else ""))
+    elif status["error"]:
+        st.caption(f"Index failed to load: {status['error']}")
+    else:
+        st.caption("Index warming up…")
+    queue = get_pipeline().stats()
+    st.caption(f"LLM queue: {queue['running']} running, {queue['waiting']} waiting")
+    top_k = st.slider("Retriever k (max)", min_value=1, max_value=10, value=5)
+    adaptive_k = st.toggle("Adaptive k", value=True,
+                           help="Rank records by blended dense/BM25 relevance and return fewer when it drops off "
+                                "sharply (off: reciprocal rank fusion, always k records)")
+    industry_filter = st.multiselect("Industries", retrieval.industries,
+                                     help="Only search these industries (industries named in the question are used otherwise)")
+    company_filter = st.multiselect("Companies", sorted(retrieval.linker.names),
+                                    format_func=lambda code: f"{code} — {retrieval.linker.name_for(code)}")
+    show_timings = st.toggle("Show timings", value=False,
+                             help="Per-stage breakdown of the last answer and rolling percentiles")
     # st.markdown(
     #     "Make sure you’ve pulled the models locally:\n\n"
     #     "`ollama pull llama3.2`\n\n`ollama pull mxbai-embed-large`"
@@ -128,55 +122,94 @@ with st.sidebar:
 
     
 
-# Allow changing k at runtime
-# retriever.search_kwargs["k"] = top_k
+# k and adaptive mode are passed per request (the retriever is shared across sessions)
 
-# Chat state
-if "messages" not in st.session_state:
-    st.session_state.messages = []
+# Chat state: the last HISTORY_CAP messages stay in the session, older ones are spilled to
+# disk; charts are kept as PNG bytes, not matplotlib Figures (see chat_history.py)
+HISTORY_CAP = 40
+if "history" not in st.session_state:
+    st.session_state.history = ChatHistory(max_messages=HISTORY_CAP)
+history = st.session_state.history
 
-for m in st.session_state.messages:
+def show_message(m):
     with st.chat_message(m["role"]):
         st.markdown(m["content"])
-        if "chart" in m:  # show stored chart
-            st.pyplot(m["chart"])
+        if m.get("chart_png") is not None:  # show stored chart
+            st.image(m["chart_png"])
+
+if history.spilled and st.toggle("Show earlier messages", value=False, key="show_older",
+                                 help=f"{history.spilled} older messages are stored on disk"):
+    for m in history.older():
+        show_message(m)
+
+for m in history:
+    show_message(m)
 
 # ---------------- Handle New User Input ----------------
 question = st.chat_input("Ask about a company’s performance, revenue, profit, etc.")
 if question:
     # Save user message
-    st.session_state.messages.append({"role": "user", "content": question})
+    history.append({"role": "user", "content": question})
     with st.chat_message("user"):
         st.markdown(question)
 
-    # Assistant response
-    if any(k in question.lower() for k in ["chart", "plot", "graph", "visualize"]):
-        company = None
-        for name in df["Company name"].dropna().astype(str).unique():
-            if name.lower() in question.lower():
-                company = name
-                break
-        fig = plot_revenue(df, question, company)
-        if fig:
-            msg = {"role": "assistant", "content": "Here is the bar chart you requested 📊", "chart": fig}
-            st.session_state.messages.append(msg)
+    # Every stage below is timed into one trace (see tracing.py); `kind` says which path ran
+    with tracer.trace("chat", question=question, model=model_name) as trace:
+        # Assistant response
+        if any(k in question.lower() for k in ["chart", "plot", "graph", "visualize"]):
+            trace.kind = "chart"
+            mentioned = retrieval.linker.link(question)
+            with trace.span("plot"):
+                png = get_charts(retrieval.index_version).chart(question, mentioned)
+            if png:
+                msg = {"role": "assistant", "content": "Here is the bar chart you requested 📊", "chart_png": png}
+                history.append(msg)
+                with st.chat_message("assistant"):
+                    st.markdown(msg["content"])
+                    st.image(png)
+            else:
+                msg = {"role": "assistant", "content": "Sorry, I couldn’t generate a chart for that query."}
+                history.append(msg)
+                with st.chat_message("assistant"):
+                    st.markdown(msg["content"])
+        elif (structured := structured_answer(question)) is not None:
+            # Computed with pandas in milliseconds; no retrieval or LLM call needed
+            trace.kind = "structured"
+            msg = {"role": "assistant", "content": structured.to_markdown()}
+            history.append(msg)
             with st.chat_message("assistant"):
                 st.markdown(msg["content"])
-                st.pyplot(fig)
         else:
-            msg = {"role": "assistant", "content": "Sorry, I couldn’t generate a chart for that query."}
-            st.session_state.messages.append(msg)
+            trace.kind = "rag"
             with st.chat_message("assistant"):
-                st.markdown(msg["content"])
-    else:
-        with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                docs = retriever.invoke(question)
-                reviews = format_docs(docs)
-                chain = get_chain("llama3.2")
-                answer = chain.invoke({"reviews": reviews, "question": question})
-
-                st.markdown(answer)
+                with st.spinner("Thinking..."):
+                    with trace.span("retrieve"):
+                        docs = get_pipeline().retrieve(retrieval, question, k=top_k, adaptive=adaptive_k,
+                                                       industries=industry_filter, codes=company_filter)
+                    doc_ids = [d.id for d in docs]
+                    answers = get_answer_cache()
+                    with trace.span("answer_cache"):
+                        answer = answers.get(question, doc_ids, model_name, retrieval.index_version)
+
+                if answer is None:
+                    # Stream tokens into the message as the model produces them; sessions asking
+                    # the same question at the same time share one generation
+                    context = get_context_builder(retrieval.index_version)
+
+                    def make_inputs():
+                        with trace.span("format"):
+                            return {"reviews": context.build(docs, question), "question": question}
+
+                    # "llm" includes any wait in the LLM queue; "llm.first_token" is time to first token
+                    answer = st.write_stream(trace.stream("llm", get_pipeline().stream_answer(
+                        AnswerCache.key(question, doc_ids, model_name),
+                        get_chain(model_name),
+                        make_inputs,
+                    )))
+                    answers.put(question, doc_ids, model_name, answer, retrieval.index_version)
+                else:
+                    trace.attrs["cached"] = True
+                    st.markdown(answer)
 
                 # 🆕 Show retrieved records only for normal questions
                 with st.expander("📂 Show retrieved records"):
@@ -189,10 +222,30 @@ if question:
                         )
                         st.text(d.page_content[:1200])  # preview (cut off long text)
 
-                st.session_state.messages.append({"role": "assistant", "content": answer})
+                # Record the final text only once streaming has completed
+                history.append({"role": "assistant", "content": answer})
+    st.session_state.last_trace = trace
+
+# ---------------- Timings ----------------
+if show_timings:
+    with st.sidebar:
+        st.subheader("Timings")
+        last = st.session_state.get("last_trace")
+        if last is not None:
+            st.caption(f"Last question ({last.kind}): {format_breakdown(last)}")
+        rolling = tracer.percentiles((50, 95))
+        if rolling:
+            st.caption(f"Last {len(tracer.recent)} requests (ms)")
+            st.dataframe(
+                [{"stage": stage, "p50": round(v["p50"]), "p95": round(v["p95"]), "n": v["n"]}
+                 for stage, v in sorted(rolling.items(), key=lambda item: -item[1]["p50"])],
+                hide_index=True,
+            )
+        else:
+            st.caption("No requests timed yet")
    
 
 # ---------------- Reset Chat ----------------
 # if st.button("🔄 Reset chat"):
-#     st.session_state.messages = []
+#     st.session_state.history.clear()
 #     st.rerun()
@@ -0,0 +1,127 @@
+# batch_qa.py
+# Unattended question answering for the evaluation set: fills the
+# "Generated answer k=1/3/5" columns that rag_eval/evaluate.py scores.
+#
+#   python main.py --batch rag_eval/data/RAGfaq.xlsx --out rag_eval/data/RAGfaq_generated.xlsx
+#
+# All questions are embedded in one batched call (the vectors land in the embedding
+# cache the retriever reads), each question is retrieved once at the largest k and the
+# smaller k values reuse the top of that ranking, and answers are generated by a pool
+# of workers. Every answer is appended to "<out>.partial.jsonl" as it completes, so
+# an interrupted run picks up where it stopped; the workbook is written at the end.
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+QUERY = "Query"
+EXPECTED_COMPANY = "Expected Company"
+GOLD = "Gold Answer"
+ANSWER_COLUMNS = {1: "Generated answer k=1", 3: "Generated answer k=3", 5: "Generated answer k=5"}
+
+
+def read_questions(path: str) -> dict[str, pd.DataFrame]:
+    """Sheets with a Query column (RAGfaq.xlsx layout), or one question per line of a text file."""
+    if path.lower().endswith((".xlsx", ".xls")):
+        sheets = pd.read_excel(path, sheet_name=None)
+        return {name: df for name, df in sheets.items() if QUERY in df.columns}
+    with open(path, encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+    return {"known": pd.DataFrame({QUERY: questions, EXPECTED_COMPANY: "", GOLD: ""})}
+
+
+def run_signature(model: str, template: str, index_version: str | None) -> str:
+    # Checkpointed answers are only reused for the same model, prompt and index
+    payload = json.dumps([model, template, index_version])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def load_checkpoint(path: str, signature: str) -> dict[tuple, str]:
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn last line from a crash
+            if rec["signature"] == signature:
+                done[(rec["sheet"], rec["row"], rec["k"])] = rec["answer"]
+    return done
+
+
+def write_workbook(sheets: dict[str, pd.DataFrame], answers: dict[tuple, str], ks: list[int], path: str) -> None:
+    tmp = path + ".tmp.xlsx"
+    with pd.ExcelWriter(tmp) as writer:
+        for name, df in sheets.items():
+            out = df.copy()
+            generated = []
+            for k in ks:
+                column = ANSWER_COLUMNS.get(k, f"Generated answer k={k}")
+                out[column] = [answers.get((name, int(row), k), "") for row in df.index]
+                generated.append(column)
+            # evaluate.py layout: Query, Expected Company, Gold Answer, answers, then anything else
+            base = [c for c in (QUERY, EXPECTED_COMPANY, GOLD) if c in out.columns]
+            rest = [c for c in out.columns if c not in base and c not in generated]
+            out[base + generated + rest].to_excel(writer, sheet_name=name, index=False)
+    os.replace(tmp, path)
+
+
+def run_batch(input_path: str, output_path: str, service, context, chain, model: str, template: str,
+              ks: tuple[int, ...] = (1, 3, 5), workers: int = 2) -> dict:
+    ks = sorted(set(ks))
+    sheets = read_questions(input_path)
+    jobs = [(name, int(row), str(q)) for name, df in sheets.items() for row, q in zip(df.index, df[QUERY])
+            if pd.notna(q) and str(q).strip()]
+
+    service.warm(background=False)
+    checkpoint_path = output_path + ".partial.jsonl"
+    signature = run_signature(model, template, service.index_version)
+    answers = load_checkpoint(checkpoint_path, signature)
+    pending = [job for job in jobs if any((job[0], job[1], k) not in answers for k in ks)]
+    print(f"[batch] {len(jobs)} questions, {len(jobs) - len(pending)} already answered")
+
+    # One embedding call for every question; retrieval then hits the embedding cache
+    questions = list(dict.fromkeys(q for _, _, q in pending))
+    if questions:
+        service.embeddings.embed_documents(questions)
+
+    # Retrieve once at the largest k; smaller k use the top of the same ranking
+    retrieved = {q: service.retrieve(q, k=ks[-1], adaptive=False) for q in questions}
+
+    # Identical contexts (e.g. a single exact-match company for every k) are generated once
+    tasks: dict[tuple, list[tuple]] = {}
+    for name, row, q in pending:
+        for k in ks:
+            if (name, row, k) in answers:
+                continue
+            reviews = context.build(retrieved[q][:k], q)
+            tasks.setdefault((q, reviews), []).append((name, row, k))
+
+    done = 0
+    with open(checkpoint_path, "a", encoding="utf-8") as log, ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(chain.invoke, {"reviews": reviews, "question": q}): targets
+            for (q, reviews), targets in tasks.items()
+        }
+        try:
+            for future in as_completed(futures):
+                answer = str(future.result()).strip()
+                for name, row, k in futures[future]:
+                    answers[(name, row, k)] = answer
+                    log.write(json.dumps({"signature": signature, "sheet": name, "row": row, "k": k,
+                                          "answer": answer}) + "\n")
+                log.flush()
+                done += 1
+                print(f"[batch] {done}/{len(futures)} generations done")
+        finally:
+            # Whatever finished is in the workbook, even if the run is interrupted
+            for future in futures:
+                future.cancel()
+            write_workbook(sheets, answers, ks, output_path)
+
+    print(f"[OK] Wrote {output_path}")
+    return {"questions": len(jobs), "generations": len(futures), "answers": len(answers)}
@@ -0,0 +1,132 @@
+# charts.py
+# Bar charts of one metric (revenue, profit, EPS, P/E) across companies and years,
+# shared by app.py and main.py. Metric values are pulled out of the DataFrame once
+# as float arrays with their rank orders precomputed, so picking the top companies
+# is an array slice, and rendered charts are kept as PNG bytes in an LRU cache keyed
+# by (companies, years, metric), so a repeated chart costs no matplotlib work.
+import io
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+
+from query_engine import METRICS, Metric
+from schema import CODE, NAME
+
+# Metrics that can be charted; the order of query_engine.METRICS (EPS / P/E before profit) is kept
+CHART_METRICS = {m.key: m for m in METRICS if m.key in ("revenue", "profit", "eps", "pe")}
+DEFAULT_METRIC = "revenue"
+_HALF = re.compile(r"\bh1\b|half[- ]year|first half")
+_PERIOD_TITLES = {"fy": "Full-Year", "h1": "Half-Year"}
+
+
+@dataclass(frozen=True)
+class ChartSpec:
+    """What to draw; also the render cache key."""
+    metric: str
+    period: str                 # "fy" / "h1"
+    years: tuple[int, ...]      # ascending
+    companies: tuple = ()       # company codes; empty = the top companies by the metric
+
+
+def parse_chart(question: str, companies=()) -> ChartSpec:
+    """Metric, period and years named in a chart request ("plot profit for 2025"); revenue by default."""
+    q = question.lower()
+    metric = next((m for m in CHART_METRICS.values() if re.search(m.pattern, q)), CHART_METRICS[DEFAULT_METRIC])
+    period = "h1" if _HALF.search(q) and "h1" in metric.columns else ("fy" if "fy" in metric.columns else "h1")
+    available = sorted(metric.columns[period])
+    mentioned = tuple(y for y in available if re.search(rf"\b{y}\b|\b(?:fy|h1) ?{str(y)[2:]}\b", q))
+    return ChartSpec(metric.key, period, mentioned or tuple(available), tuple(companies))
+
+
+class ChartService:
+    """Renders ChartSpecs to PNG bytes from precomputed arrays, memoizing the last `max_entries` charts."""
+
+    def __init__(self, df: pd.DataFrame, top_n: int = 5, max_entries: int = 128):
+        self.top_n = top_n
+        self.max_entries = max_entries
+        self.names = df[NAME].astype(str).str.strip().to_numpy()
+        self.rows = {code: i for i, code in enumerate(df[CODE]) if pd.notna(code)}
+        self.values: dict[str, np.ndarray] = {}
+        self.orders: dict[tuple[str, str, tuple[int, ...]], np.ndarray] = {}
+        for metric in CHART_METRICS.values():
+            for period, years in metric.columns.items():
+                for column in years.values():
+                    self.values[column] = pd.to_numeric(df[column], errors="coerce").to_numpy(dtype=float)
+                # Rank order for every combination of years (several years rank by their max)
+                for n in range(1, len(years) + 1):
+                    for combo in combinations(sorted(years), n):
+                        self.orders[(metric.key, period, combo)] = self._rank(
+                            np.column_stack([self.values[years[y]] for y in combo]))
+        self.hits = 0
+        self.misses = 0
+        self._cache: OrderedDict[ChartSpec, bytes | None] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _rank(matrix: np.ndarray) -> np.ndarray:
+        """Row indices by descending max across columns; rows with no value are dropped."""
+        finite = ~np.isnan(matrix).all(axis=1)
+        best = np.where(np.isnan(matrix), -np.inf, matrix).max(axis=1)
+        order = np.argsort(-best, kind="stable")
+        return order[finite[order]]
+
+    def select(self, spec: ChartSpec) -> np.ndarray:
+        """Rows to draw: the named companies that have a value, or the top companies."""
+        if not spec.companies:
+            return self.orders[(spec.metric, spec.period, spec.years)][:self.top_n]
+        rows = np.array([self.rows[c] for c in spec.companies if c in self.rows], dtype=int)
+        columns = CHART_METRICS[spec.metric].columns[spec.period]
+        matrix = np.column_stack([self.values[columns[y]][rows] for y in spec.years])
+        return rows[~np.isnan(matrix).all(axis=1)][:self.top_n]
+
+    def render(self, spec: ChartSpec) -> bytes | None:
+        """PNG of the chart, or None when none of the companies have the metric."""
+        with self._lock:
+            if spec in self._cache:
+                self.hits += 1
+                self._cache.move_to_end(spec)
+                return self._cache[spec]
+            self.misses += 1
+        png = self._draw(spec)
+        with self._lock:
+            self._cache[spec] = png
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return png
+
+    def chart(self, question: str, companies=()) -> bytes | None:
+        return self.render(parse_chart(question, companies))
+
+    def _draw(self, spec: ChartSpec) -> bytes | None:
+        rows = self.select(spec)
+        if not len(rows):
+            return None
+        metric: Metric = CHART_METRICS[spec.metric]
+        # A bare Figure (no pyplot) is thread-safe and is freed with its last reference
+        fig = Figure(figsize=(8, 5))
+        ax = fig.subplots()
+        x = np.arange(len(rows))
+        width = 0.8 / len(spec.years) if len(spec.years) > 1 else 0.6
+        for i, year in enumerate(spec.years):
+            offset = (i - (len(spec.years) - 1) / 2) * width
+            column = metric.columns[spec.period][year]
+            ax.bar(x + offset, self.values[column][rows], width,
+                   label=f"{metric.label} {spec.period.upper()} {year}")
+        ax.set_xticks(x)
+        ax.set_xticklabels(self.names[rows], rotation=45, ha="right")
+        ax.set_ylabel(f"{metric.label} ({metric.unit})")
+        ax.set_title(f"{_PERIOD_TITLES[spec.period]} {metric.label}")
+        ax.legend()
+        fig.tight_layout()
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png", dpi=100)
+        return buffer.getvalue()
+
+    def stats(self) -> dict:
+        return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses}
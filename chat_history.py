@@ -0,0 +1,106 @@
+# chat_history.py
+# Bounded chat history for a Streamlit session. Messages are plain dicts (role,
+# content and, for charts, PNG bytes under "chart_png"), never live matplotlib
+# Figures, so a rerun only re-sends images instead of re-drawing every past chart.
+# Only the last `max_messages` stay in session memory; older ones are appended to a
+# per-session JSONL file on disk (chart PNGs as files next to it) and can be paged
+# back in on demand. Spill files of sessions untouched for `max_age_days` are deleted
+# whenever a new ChatHistory is created.
+import json
+import os
+import shutil
+import time
+import uuid
+
+HISTORY_DIR = "./.cache/chat_history"
+DEFAULT_MAX_MESSAGES = 40
+DEFAULT_MAX_AGE_DAYS = 7.0
+
+
+def prune_sessions(directory: str = HISTORY_DIR, max_age_days: float = DEFAULT_MAX_AGE_DAYS,
+                   keep: str | None = None) -> list[str]:
+    """Delete spill files (JSONL + chart directory) of sessions last written over `max_age_days` ago."""
+    if not os.path.isdir(directory):
+        return []
+    cutoff = time.time() - max_age_days * 86400
+    modified: dict[str, float] = {}
+    for name in os.listdir(directory):
+        session = name[:-len(".jsonl")] if name.endswith(".jsonl") else name
+        mtime = os.path.getmtime(os.path.join(directory, name))
+        modified[session] = max(modified.get(session, 0.0), mtime)
+    removed = []
+    for session, mtime in sorted(modified.items()):
+        if session == keep or mtime >= cutoff:
+            continue
+        path = os.path.join(directory, f"{session}.jsonl")
+        if os.path.exists(path):
+            os.remove(path)
+        shutil.rmtree(os.path.join(directory, session), ignore_errors=True)
+        removed.append(session)
+    return removed
+
+
+class ChatHistory:
+    """Last `max_messages` messages in memory, the rest spilled to `<directory>/<session>.jsonl`."""
+
+    def __init__(self, max_messages: int = DEFAULT_MAX_MESSAGES, directory: str = HISTORY_DIR,
+                 session_id: str | None = None, max_age_days: float | None = DEFAULT_MAX_AGE_DAYS):
+        self.max_messages = max_messages
+        self.directory = directory
+        self.session_id = session_id or uuid.uuid4().hex
+        self.messages: list[dict] = []
+        self.spilled = 0
+        if max_age_days is not None:
+            prune_sessions(directory, max_age_days, keep=self.session_id)
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, f"{self.session_id}.jsonl")
+
+    def __iter__(self):
+        return iter(self.messages)
+
+    def __len__(self) -> int:
+        return self.spilled + len(self.messages)
+
+    def append(self, message: dict) -> None:
+        self.messages.append(message)
+        overflow = len(self.messages) - self.max_messages
+        if overflow > 0:
+            self._spill(self.messages[:overflow])
+            del self.messages[:overflow]
+
+    def _spill(self, messages: list[dict]) -> None:
+        os.makedirs(os.path.join(self.directory, self.session_id), exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            for message in messages:
+                record = {key: value for key, value in message.items() if key != "chart_png"}
+                if message.get("chart_png") is not None:
+                    chart = os.path.join(self.directory, self.session_id, f"{self.spilled:06d}.png")
+                    with open(chart, "wb") as out:
+                        out.write(message["chart_png"])
+                    record["chart_file"] = chart
+                f.write(json.dumps(record, default=str) + "\n")
+                self.spilled += 1
+
+    def older(self, limit: int | None = None) -> list[dict]:
+        """Spilled messages, oldest first (the last `limit` of them); charts are read back as PNG bytes."""
+        if not self.spilled or not os.path.exists(self.path):
+            return []
+        with open(self.path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        if limit is not None:
+            records = records[-limit:]
+        for record in records:
+            chart = record.pop("chart_file", None)
+            if chart and os.path.exists(chart):
+                with open(chart, "rb") as image:
+                    record["chart_png"] = image.read()
+        return records
+
+    def clear(self) -> None:
+        self.messages = []
+        self.spilled = 0
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        shutil.rmtree(os.path.join(self.directory, self.session_id), ignore_errors=True)
@@ -0,0 +1,153 @@
+# context_builder.py
+# Assembles the LLM context from structured company records instead of pasting the
+# full ~25-line rendered document for every retrieved company. Only the fields that
+# match the question's intent are included, shared boilerplate is emitted once, and
+# the result is trimmed to a token budget (prompt processing time on a CPU-only
+# Ollama host grows with input length).
+import re
+
+import pandas as pd
+
+from entity_linker import clean_industry
+from schema import (
+    ADDITIONAL_INFO, ASX_PAGE, BVPS, CODE, DESCRIPTION, DOCUMENT_FIELDS, EPS_H1_24, EPS_H1_25,
+    EQUITY, INDUSTRY, MARKET_PRICE, NAME, PB, PE_H1_25, PERCENT_CHANGE_COLUMNS, PROFIT_CHANGE_FY,
+    PROFIT_CHANGE_H1, PROFIT_FY24, PROFIT_FY25, PROFIT_H1_24, PROFIT_H1_25, REVENUE_CHANGE_FY,
+    REVENUE_CHANGE_H1, REVENUE_FY24, REVENUE_FY25, REVENUE_H1_24, REVENUE_H1_25, SHARES, WEBSITE,
+)
+
+LABELS = {column: label for label, column in DOCUMENT_FIELDS}
+
+# The one answer prompt, shared by app.py, main.py and the load driver (eval/generator_adapter.py)
+PROMPT_TEMPLATE = """
+You are an expert financial analyst.
+Answer the question based on the company financial reports below.
+
+Here are some relevant company records:{reviews}
+
+Here is the question to answer: {question}
+
+If the questions is not relevant to financial reports, please reply accordingly.
+"""
+
+# Field groups, each with the question keywords that ask for it
+GROUPS = {
+    "revenue": (r"revenue|sales|turnover|grow|top line",
+                [REVENUE_FY25, REVENUE_FY24, REVENUE_CHANGE_FY, REVENUE_H1_25, REVENUE_H1_24, REVENUE_CHANGE_H1]),
+    "profit": (r"profit|earnings|net income|loss|margin",
+               [PROFIT_FY25, PROFIT_FY24, PROFIT_CHANGE_FY, PROFIT_H1_25, PROFIT_H1_24, PROFIT_CHANGE_H1]),
+    "per_share": (r"\beps\b|per share|\bp/?e\b|price|valuation|\bp/?b\b|book value|bvps|cheap|expensive|overvalued|undervalued",
+                  [EPS_H1_25, EPS_H1_24, PE_H1_25, MARKET_PRICE, BVPS, PB]),
+    "balance": (r"equity|shares|balance|capital", [EQUITY, SHARES]),
+    "profile": (r"what does|describe|description|business|operat|project|growth project|strategy|sector|industry|website|asx|who is",
+                [DESCRIPTION, ADDITIONAL_INFO, WEBSITE, ASX_PAGE]),
+}
+# Used when the question matches no group: headline numbers plus a short description
+DEFAULT_FIELDS = [REVENUE_FY25, REVENUE_FY24, REVENUE_CHANGE_FY, PROFIT_FY25, PROFIT_FY24,
+                  PROFIT_CHANGE_FY, EPS_H1_25, PE_H1_25, DESCRIPTION]
+LONG_TEXT = {DESCRIPTION, ADDITIONAL_INFO}
+
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English prose; good enough for budgeting
+    return max(1, len(text) // 4)
+
+
+def format_value(column: str, value) -> str:
+    if pd.isna(value):
+        return "n/a"
+    if column in PERCENT_CHANGE_COLUMNS:
+        return f"{value:.1%}"
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    return " ".join(str(value).split())
+
+
+def question_groups(question: str) -> list[str]:
+    """Names of the field GROUPS the question asks about (empty: none matched)."""
+    q = question.lower()
+    return [group for group, (pattern, _) in GROUPS.items() if re.search(pattern, q)]
+
+
+class ContextBuilder:
+    """Builds a compact, question-specific context from retrieved company records."""
+
+    def __init__(self, df: pd.DataFrame, max_tokens: int = 1200):
+        self.max_tokens = max_tokens
+        records = df.assign(**{INDUSTRY: df[INDUSTRY].map(clean_industry)})
+        self.records = {code: row for code, row in zip(records[CODE], records.to_dict("records"))}
+
+    @staticmethod
+    def select_fields(question: str) -> list[str]:
+        fields = []
+        for group in question_groups(question):
+            fields += [c for c in GROUPS[group][1] if c not in fields]
+        return fields or list(DEFAULT_FIELDS)
+
+    def build(self, docs, question: str) -> str:
+        codes = []
+        for d in docs:
+            code = (d.metadata or {}).get("company_code")
+            if code in self.records and code not in codes:
+                codes.append(code)
+        if not codes:
+            # Records we don't know about: fall back to the raw documents
+            return "\n\n---\n\n".join(d.page_content for d in docs)
+
+        rows = [self.records[c] for c in codes]
+        fields = self.select_fields(question)
+
+        # Text values identical across every record (e.g. all in one industry) are stated once
+        shared = []
+        if len(rows) > 1:
+            for column in [INDUSTRY] + [f for f in fields if f in LONG_TEXT]:
+                values = {format_value(column, r.get(column)) for r in rows}
+                if len(values) == 1:
+                    shared.append(column)
+        parts = []
+        if shared:
+            label = lambda c: "Industry" if c == INDUSTRY else LABELS[c]
+            parts.append("All records: " + "; ".join(f"{label(c)}: {format_value(c, rows[0].get(c))}" for c in shared))
+
+        budget = self.max_tokens - sum(estimate_tokens(p) for p in parts)
+        per_record = max(budget // len(rows), 40)
+        seen_sentences: set[str] = set()
+        for i, row in enumerate(rows, 1):
+            header = f"[Doc {i}] Company: {format_value(NAME, row.get(NAME))} (Code: {row.get(CODE)})"
+            if INDUSTRY not in shared:
+                header += f" | Industry: {row.get(INDUSTRY)}"
+            lines = [header]
+            used = estimate_tokens(header)
+            for column in fields:
+                if column in shared:
+                    continue
+                value = format_value(column, row.get(column))
+                if column in LONG_TEXT:
+                    # Drop sentences another record already contributed (shared boilerplate)
+                    sentences = [s for s in _SENTENCE.split(value) if s and s not in seen_sentences]
+                    seen_sentences.update(sentences)
+                    value = " ".join(sentences)
+                    if not value:
+                        continue
+                line = f"{LABELS[column]}: {value}"
+                room = per_record - used
+                if estimate_tokens(line) > room:
+                    if column not in LONG_TEXT or room < 20:
+                        continue
+                    line = line[:room * 4].rsplit(" ", 1)[0] + " …"
+                lines.append(line)
+                used += estimate_tokens(line)
+            parts.append("\n".join(lines))
+        return "\n\n---\n\n".join(parts)
+
+
+def format_docs(docs):
+    # Pretty print retrieved docs for the prompt (the full documents, no field selection)
+    parts = []
+    for i, d in enumerate(docs, 1):
+        meta = d.metadata or {}
+        header = f"[Doc {i}] Company Code: {meta.get('company_code','?')} | Industry: {meta.get('industry','?')}"
+        parts.append(header + "\n" + d.page_content)
+    return "\n\n---\n\n".join(parts)
@@ -0,0 +1,107 @@
+# dataset.py
+# Loads ragdata1.xlsx through a columnar (Arrow/Feather) cache.
+#
+# Parsing the workbook with openpyxl is slow, so the first load converts it once to
+# an uncompressed Feather file next to a small metadata file. Later loads memory-map
+# the Feather file instead. The cache is rebuilt when the workbook's mtime/size
+# change and its content hash no longer matches.
+import hashlib
+import json
+import os
+import threading
+
+import pandas as pd
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # pragma: no cover - pyarrow is in requirements.txt
+    feather = None
+
+DEFAULT_PATH = "ragdata1.xlsx"
+CACHE_DIR = "./.cache"
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _cache_paths(path: str, cache_dir: str) -> tuple[str, str]:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{stem}.feather"), os.path.join(cache_dir, f"{stem}.meta.json")
+
+
+def _tmp_path(path: str) -> str:
+    # Unique per process and thread: the warm-up thread and a page can both build the cache
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def _read_meta(meta_path: str) -> dict:
+    if not os.path.exists(meta_path):
+        return {}
+    with open(meta_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_meta(meta: dict, meta_path: str) -> None:
+    tmp = _tmp_path(meta_path)
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, meta_path)
+
+
+def _cache_is_fresh(path: str, data_path: str, meta_path: str) -> bool:
+    meta = _read_meta(meta_path)
+    if not meta or not os.path.exists(data_path):
+        return False
+    st = os.stat(path)
+    if meta.get("mtime") == st.st_mtime and meta.get("size") == st.st_size:
+        return True
+    # Touched but maybe not changed (e.g. re-saved or copied): compare contents
+    if meta.get("sha256") == file_sha256(path):
+        meta.update(mtime=st.st_mtime, size=st.st_size)
+        _write_meta(meta, meta_path)
+        return True
+    return False
+
+
+def build_cache(path: str = DEFAULT_PATH, cache_dir: str = CACHE_DIR) -> pd.DataFrame:
+    """Parse the workbook and (re)write its Feather cache."""
+    df = pd.read_excel(path)
+    if feather is None:
+        return df
+
+    os.makedirs(cache_dir, exist_ok=True)
+    data_path, meta_path = _cache_paths(path, cache_dir)
+    tmp = _tmp_path(data_path)
+    # Uncompressed so it can be memory-mapped on read
+    feather.write_feather(df, tmp, compression="uncompressed")
+    os.replace(tmp, data_path)
+
+    st = os.stat(path)
+    _write_meta({"source": os.path.abspath(path), "mtime": st.st_mtime, "size": st.st_size,
+                 "sha256": file_sha256(path)}, meta_path)
+    return df
+
+
+def load_dataset(path: str = DEFAULT_PATH, cache_dir: str = CACHE_DIR) -> pd.DataFrame:
+    """Return the company DataFrame, reading the columnar cache when it is fresh."""
+    if feather is None:
+        return pd.read_excel(path)
+
+    data_path, meta_path = _cache_paths(path, cache_dir)
+    if not _cache_is_fresh(path, data_path, meta_path):
+        return build_cache(path, cache_dir)
+
+    table = feather.read_table(data_path, memory_map=True)
+    # split_blocks avoids consolidating columns into one 2D block (an extra copy)
+    return table.to_pandas(split_blocks=True)
+
+
+if __name__ == "__main__":
+    # python dataset.py  -> (re)build the cache ahead of deploys
+    frame = build_cache()
+    print(f"[OK] Cached {len(frame)} rows x {len(frame.columns)} columns from {DEFAULT_PATH}")
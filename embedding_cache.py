@@ -0,0 +1,150 @@
+# embedding_cache.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps any LangChain embeddings object with a persistent SQLite cache.
+
+    Vectors are keyed by (model name, sha256 of the text), so the ingest path,
+    the retriever and eval scripts all share the same cache file. Once the cache
+    holds more than `max_entries` vectors, the least recently used ones are evicted.
+    """
+
+    def __init__(
+        self,
+        base: Embeddings,
+        model_name: str | None = None,
+        path: str = "./.cache/embeddings.sqlite",
+        max_entries: int = 200_000,
+    ):
+        self.base = base
+        self.model_name = model_name or getattr(base, "model", type(base).__name__)
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model     TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector    BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+        self._conn.commit()
+
+    # ---------------- Cache access ----------------
+    def _lookup(self, hashes: list[str]) -> dict[str, list[float]]:
+        found = {}
+        with self._lock:
+            # SQLite caps the number of bound parameters, so query in slices
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({marks})",
+                    [self.model_name, *chunk],
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, self.model_name, h) for h in found],
+                )
+                self._conn.commit()
+        return found
+
+    def _store(self, items: dict[str, list[float]]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                [
+                    (self.model_name, h, np.asarray(v, dtype=np.float32).tobytes(), now)
+                    for h, v in items.items()
+                ],
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                """
+                DELETE FROM embeddings WHERE rowid IN (
+                    SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?
+                )
+                """,
+                (overflow,),
+            )
+
+    # ---------------- Embeddings interface ----------------
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        hashes = [text_hash(t) for t in texts]
+        cached = self._lookup(list(set(hashes)))
+
+        # Embed each distinct missing text once, in a single call to the base model
+        missing = {}
+        for h, t in zip(hashes, texts):
+            if h not in cached and h not in missing:
+                missing[h] = t
+        if missing:
+            vectors = self.base.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            self._store(fresh)
+            cached.update(fresh)
+
+        self.misses += len(missing)
+        self.hits += len(texts) - len(missing)
+        return [cached[h] for h in hashes]
+
+    def embed_query(self, text: str) -> list[float]:
+        h = text_hash(text)
+        cached = self._lookup([h])
+        if h in cached:
+            self.hits += 1
+            return cached[h]
+        self.misses += 1
+        vector = self.base.embed_query(text)
+        self._store({h: vector})
+        return vector
+
+    def forget(self, texts: list[str]) -> None:
+        """Drop the cached vectors of `texts`, e.g. so a benchmark pass starts cold."""
+        hashes = list({text_hash(t) for t in texts})
+        with self._lock:
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                self._conn.execute(f"DELETE FROM embeddings WHERE model = ? AND text_hash IN ({marks})",
+                                   [self.model_name, *chunk])
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": size}
@@ -0,0 +1,159 @@
+# entity_linker.py
+# Finds the companies (by ASX code or name) and industries a question mentions,
+# in one pass over the text.
+import re
+from collections import deque
+
+import pandas as pd
+
+from schema import CODE, INDUSTRY, NAME
+
+# Trailing words people usually leave out when naming a company
+_NAME_SUFFIXES = re.compile(r"(\s+(limited|ltd\.?|inc\.?|plc|corporation|corp\.?))+$")
+
+
+class AhoCorasick:
+    """Minimal Aho-Corasick automaton: all patterns are matched in a single scan."""
+
+    def __init__(self):
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[list[tuple[int, object]]] = [[]]
+
+    def add(self, pattern: str, value) -> None:
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((len(pattern), value))
+
+    def build(self) -> "AhoCorasick":
+        # Breadth-first pass to set failure links and merge outputs along them
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+        return self
+
+    def iter_matches(self, text: str):
+        """Yield (start, end, value) for every pattern occurrence in `text`."""
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for length, value in self._out[node]:
+                yield i + 1 - length, i + 1, value
+
+
+def _is_boundary(text: str, start: int, end: int) -> bool:
+    before = text[start - 1] if start > 0 else " "
+    after = text[end] if end < len(text) else " "
+    return not before.isalnum() and not after.isalnum()
+
+
+class CompanyLinker:
+    """Maps mentions of `Company Code` / `Company name` in a question to company codes.
+
+    Codes must appear in upper case ("BHP", "COL") so short tickers don't fire on
+    ordinary words like "car" or "min"; names and their suffix-less aliases
+    ("JB Hi-Fi" for "JB HI-FI Limited") match case-insensitively.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.names: dict[str, str] = {}
+        self._automaton = AhoCorasick()
+
+        for code, name in zip(df[CODE], df[NAME]):
+            if pd.isna(code):
+                continue
+            self.names.setdefault(code, str(name).strip())
+            ticker = str(code).strip()
+            self._automaton.add(ticker.lower(), ("code", code, ticker))
+            if pd.isna(name):
+                continue
+            full = " ".join(str(name).lower().split())
+            for alias in {full, _NAME_SUFFIXES.sub("", full)}:
+                if len(alias) >= 3:
+                    self._automaton.add(alias, ("name", code, alias))
+        self._automaton.build()
+
+    def link(self, question: str) -> list:
+        """Company codes mentioned in the question, in order of first mention."""
+        lowered = question.lower()
+        mentions = []
+        for start, end, (kind, code, pattern) in self._automaton.iter_matches(lowered):
+            if not _is_boundary(lowered, start, end):
+                continue
+            if kind == "code" and question[start:end] != pattern:
+                continue
+            mentions.append((start, code))
+
+        codes = []
+        for _, code in sorted(mentions, key=lambda m: m[0]):
+            if code not in codes:
+                codes.append(code)
+        return codes
+
+    def name_for(self, code) -> str:
+        return self.names.get(code, str(code))
+
+
+def clean_industry(value) -> str:
+    # The sheet has stray tabs / trailing spaces in Industry Group values
+    return " ".join(str(value).split())
+
+
+class IndustryLinker:
+    """Maps industry mentions ("materials", "REITs", "real estate") to Industry Group values.
+
+    Aliases are the full name, any parenthesised acronym, and each two-word window
+    of the name (plus a distinctive first word) that belongs to only one industry.
+    """
+
+    _GENERIC = {"consumer", "equity", "and", "distribution", "retail", "services", "equipment"}
+
+    def __init__(self, df: pd.DataFrame):
+        self.industries = sorted({clean_industry(v) for v in df[INDUSTRY].dropna()})
+
+        candidates: dict[str, set[str]] = {}
+        for industry in self.industries:
+            lowered = industry.lower()
+            aliases = {lowered}
+            aliases.update(a.lower() for a in re.findall(r"\(([^)]+)\)", industry))
+            words = re.findall(r"[a-z]+", re.sub(r"\(.*?\)", "", lowered))
+            if words and words[0] not in self._GENERIC and len(words[0]) > 4:
+                aliases.add(words[0])
+            aliases.update(f"{a} {b}" for a, b in zip(words, words[1:]) if "and" not in (a, b))
+            for alias in aliases:
+                candidates.setdefault(alias, set()).add(industry)
+
+        self._automaton = AhoCorasick()
+        for alias, owners in candidates.items():
+            if len(owners) == 1:
+                self._automaton.add(alias, next(iter(owners)))
+        self._automaton.build()
+
+    def link(self, question: str) -> list[str]:
+        """Industry Group values mentioned in the question (cleaned of stray whitespace)."""
+        lowered = question.lower()
+        found = []
+        for start, end, industry in self._automaton.iter_matches(lowered):
+            # allow a plural "s" after an alias ("insurances", "reits")
+            if end < len(lowered) and lowered[end] == "s":
+                end += 1
+            if _is_boundary(lowered, start, end) and industry not in found:
+                found.append(industry)
+        return found
@@ -0,0 +1,174 @@
+# eval/bench_backends.py
+# Compares the Chroma collection with FlatVectorStore (float16 / int8) on synthetic
+# embeddings: build time, cold load, single and batched query latency, filtered
+# queries, recall@k against exact float32 search, and on-disk size.
+#
+#   python -m eval.bench_backends --docs 5000 --dim 1024 --queries 200
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+
+def synthetic_corpus(n_docs: int, dim: int, n_industries: int = 8, seed: int = 0):
+    """Clustered unit vectors (one cluster per industry) with matching metadata."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((n_industries, dim)).astype(np.float32)
+    labels = rng.integers(0, n_industries, n_docs)
+    vectors = centres[labels] + 0.8 * rng.standard_normal((n_docs, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [f"C{i:05d}" for i in range(n_docs)]
+    metadatas = [{"company_code": doc_id, "industry": f"Industry {l}"} for doc_id, l in zip(ids, labels)]
+    return ids, vectors, metadatas
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    sims = queries @ vectors.T
+    return np.argsort(-sims, axis=1)[:, :k]
+
+
+def dir_size_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total / 1e6
+
+
+def percentile_ms(samples: list[float], p: float) -> float:
+    return float(np.percentile(samples, p)) * 1000
+
+
+# ---------------- Backends ----------------
+class ChromaBench:
+    name = "chroma"
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def build(self, ids, vectors, metadatas):
+        from langchain_chroma import Chroma
+
+        store = Chroma(collection_name="bench", persist_directory=self.path, embedding_function=None)
+        for start in range(0, len(ids), 2000):
+            end = start + 2000
+            store._collection.upsert(ids=ids[start:end], embeddings=vectors[start:end].tolist(),
+                                     documents=ids[start:end], metadatas=metadatas[start:end])
+
+    def open(self):
+        from langchain_chroma import Chroma
+
+        self.store = Chroma(collection_name="bench", persist_directory=self.path, embedding_function=None)
+        self.store._collection.count()  # force the collection to load
+
+    def query(self, q, k, where=None):
+        return self.store._collection.query(query_embeddings=[q.tolist()], n_results=k, where=where)["ids"][0]
+
+    def query_batch(self, qs, k):
+        return self.store._collection.query(query_embeddings=qs.tolist(), n_results=k)["ids"]
+
+
+class FlatBench:
+    def __init__(self, path: str, dtype: str):
+        self.path = path
+        self.dtype = dtype
+        self.name = f"flat-{dtype}"
+
+    def build(self, ids, vectors, metadatas):
+        from flat_index import FlatVectorStore
+
+        store = FlatVectorStore(self.path, None, dtype=self.dtype)
+        store.upsert_embeddings(ids, vectors, ids, metadatas)
+
+    def open(self):
+        from flat_index import FlatVectorStore
+
+        self.store = FlatVectorStore(self.path, None, dtype=self.dtype)
+
+    def query(self, q, k, where=None):
+        (hits,) = self.store.search_by_vectors([q], k, where)
+        return [self.store.ids[row] for row, _ in hits]
+
+    def query_batch(self, qs, k):
+        return [[self.store.ids[row] for row, _ in hits] for hits in self.store.search_by_vectors(qs, k)]
+
+
+def run(backend, ids, vectors, metadatas, queries, truth, k: int) -> dict:
+    start = time.perf_counter()
+    backend.build(ids, vectors, metadatas)
+    build_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    backend.open()
+    load_s = time.perf_counter() - start
+
+    latencies, found = [], []
+    for q in queries:
+        start = time.perf_counter()
+        found.append(backend.query(q, k))
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    backend.query_batch(queries, k)
+    batch_s = time.perf_counter() - start
+
+    filtered = []
+    where = {"industry": "Industry 0"}
+    for q in queries[:50]:
+        start = time.perf_counter()
+        backend.query(q, k, where)
+        filtered.append(time.perf_counter() - start)
+
+    position = {doc_id: i for i, doc_id in enumerate(ids)}
+    recall = np.mean([
+        len({position[d] for d in got} & set(exact)) / k for got, exact in zip(found, truth)
+    ])
+    return {
+        "backend": backend.name,
+        "build_s": round(build_s, 3),
+        "load_ms": round(load_s * 1000, 1),
+        "p50_ms": round(percentile_ms(latencies, 50), 2),
+        "p95_ms": round(percentile_ms(latencies, 95), 2),
+        "batch_qps": round(len(queries) / batch_s, 1),
+        "filtered_p50_ms": round(percentile_ms(filtered, 50), 2),
+        f"recall@{k}": round(float(recall), 4),
+        "disk_mb": round(dir_size_mb(backend.path), 2),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", type=int, default=5000)
+    ap.add_argument("--dim", type=int, default=1024)  # mxbai-embed-large
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("-k", type=int, default=5)
+    args = ap.parse_args()
+
+    ids, vectors, metadatas = synthetic_corpus(args.docs, args.dim)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(0, args.docs, args.queries)] + 0.3 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = exact_top_k(vectors, queries, args.k)
+
+    workdir = tempfile.mkdtemp(prefix="bench_backends_")
+    try:
+        backends = [
+            ChromaBench(os.path.join(workdir, "chroma")),
+            FlatBench(os.path.join(workdir, "flat16"), "float16"),
+            FlatBench(os.path.join(workdir, "flat8"), "int8"),
+        ]
+        rows = [run(b, ids, vectors, metadatas, queries, truth, args.k) for b in backends]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"[bench] {args.docs} docs x {args.dim} dims, {args.queries} queries, k={args.k}")
+    header = list(rows[0])
+    print(" | ".join(header))
+    for row in rows:
+        print(" | ".join(str(row[h]) for h in header))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+# eval/generator_adapter.py
+# End-to-end load test of the app's serving path (pipeline.Pipeline retrieval ->
+# answer cache -> format -> prompt | OllamaLLM behind the Pipeline's semaphore and
+# single-flighting) without a real Ollama instance. FakeOllama is a local Ollama-compatible HTTP server
+# (/api/generate streaming, /api/embed) whose time-to-first-token, token rate and
+# jitter are configurable and seeded per prompt, so runs are reproducible; the load
+# driver replays a question mix at a target concurrency and reports latency, TTFT and
+# throughput percentiles.
+#
+#   python -m eval.generator_adapter --requests 200 --concurrency 8 --ttft-ms 150 --tokens-per-s 40
+#   python -m eval.generator_adapter --ollama http://localhost:11434     # real server, live index
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from eval import metrics
+from eval.report import print_table
+
+FAKE_EMBED_MODEL = "fake-embed"  # keeps fake vectors apart from real ones in the embedding cache
+DEFAULT_MIX = {"known": 3, "infered": 1, "out_of_kb": 1}
+_WORDS = ("revenue", "profit", "increased", "decreased", "compared", "to", "the", "previous", "period",
+          "according", "records", "company", "reported", "million", "AUD", "for", "half-year", "and", ".")
+
+
+# ---------------- Fake Ollama server ----------------
+class FakeOllama:
+    """Ollama-compatible stand-in with a deterministic speed profile.
+
+    Each generation waits `ttft_ms` (plus `prompt tokens / prefill_tokens_per_s`
+    when set) before its first token, then emits `answer_tokens` tokens at
+    `tokens_per_s`. Every delay is scaled by a factor drawn uniformly from
+    [1 - jitter, 1 + jitter] with a RNG seeded from (seed, prompt), so the same
+    prompt always gets the same timings. Embeddings are hash-seeded unit vectors.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, ttft_ms: float = 200.0,
+                 tokens_per_s: float = 30.0, answer_tokens: int = 60, jitter: float = 0.2,
+                 prefill_tokens_per_s: float | None = None, embed_dim: int = 256, seed: int = 0):
+        self.ttft_ms = ttft_ms
+        self.tokens_per_s = tokens_per_s
+        self.answer_tokens = answer_tokens
+        self.jitter = jitter
+        self.prefill_tokens_per_s = prefill_tokens_per_s
+        self.embed_dim = embed_dim
+        self.seed = seed
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllama":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _rng(self, text: str) -> random.Random:
+        digest = hashlib.sha256(f"{self.seed}:{text}".encode("utf-8")).digest()
+        return random.Random(int.from_bytes(digest[:8], "little"))
+
+    def _jittered(self, rng: random.Random, seconds: float) -> float:
+        return max(seconds * (1 + rng.uniform(-self.jitter, self.jitter)), 0.0)
+
+    def embed(self, text: str) -> list[float]:
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        v = np.random.default_rng(int.from_bytes(digest[:8], "little")).standard_normal(self.embed_dim)
+        return (v / np.linalg.norm(v)).tolist()
+
+    def generate(self, prompt: str):
+        """Yield (delay before the token, token) pairs for `prompt`."""
+        rng = self._rng(prompt)
+        first = self.ttft_ms / 1000
+        if self.prefill_tokens_per_s:
+            first += len(prompt) / 4 / self.prefill_tokens_per_s  # ~4 characters per token
+        yield self._jittered(rng, first), rng.choice(_WORDS)
+        for _ in range(self.answer_tokens - 1):
+            yield self._jittered(rng, 1 / self.tokens_per_s), " " + rng.choice(_WORDS)
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like Ollama
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, payload: dict, status: int = 200) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path in ("/api/tags", "/api/ps"):
+                    self._json({"models": []})
+                elif self.path == "/api/version":
+                    self._json({"version": "0.0.0-fake"})
+                else:
+                    self._json({"error": "not found"}, 404)
+
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with fake._lock:
+                    fake.requests += 1
+                if self.path in ("/api/embed", "/api/embeddings"):
+                    texts = body.get("input", body.get("prompt", ""))
+                    texts = [texts] if isinstance(texts, str) else texts
+                    vectors = [fake.embed(t) for t in texts]
+                    if self.path == "/api/embeddings":
+                        self._json({"embedding": vectors[0]})
+                    else:
+                        self._json({"model": body.get("model"), "embeddings": vectors})
+                elif self.path == "/api/generate":
+                    self._generate(body)
+                else:
+                    self._json({"error": "not found"}, 404)
+
+            def _generate(self, body: dict) -> None:
+                model, tokens = body.get("model"), []
+                stream = body.get("stream", True)
+                if not stream:
+                    for delay, token in fake.generate(body.get("prompt", "")):
+                        time.sleep(delay)
+                        tokens.append(token)
+                    self._json({"model": model, "response": "".join(tokens), "done": True,
+                                "done_reason": "stop", "eval_count": len(tokens)})
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for delay, token in fake.generate(body.get("prompt", "")):
+                    time.sleep(delay)
+                    tokens.append(token)
+                    self._chunk({"model": model, "response": token, "done": False})
+                self._chunk({"model": model, "response": "", "done": True, "done_reason": "stop",
+                             "eval_count": len(tokens)})
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _chunk(self, payload: dict) -> None:
+                data = (json.dumps(payload) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+# ---------------- Load driver ----------------
+def question_mix(path: str, mix: dict[str, float], n: int, seed: int = 0) -> list[str]:
+    """`n` questions drawn from the sheets of an eval workbook, weighted by sheet name."""
+    from batch_qa import QUERY, read_questions
+
+    sheets = {name.lower(): df[QUERY].dropna().astype(str).tolist() for name, df in read_questions(path).items()}
+    pools = [(sheets[name.lower()], weight) for name, weight in mix.items() if sheets.get(name.lower())]
+    if not pools:
+        raise ValueError(f"None of {list(mix)} found in {path}; sheets: {list(sheets)}")
+    rng = random.Random(seed)
+    chosen = rng.choices([p for p, _ in pools], weights=[w for _, w in pools], k=n)
+    return [rng.choice(pool) for pool in chosen]
+
+
+def make_chain(model: str, base_url: str | None = None):
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_ollama.llms import OllamaLLM
+
+    from context_builder import PROMPT_TEMPLATE
+    from pipeline import pooled_client_kwargs
+
+    llm = OllamaLLM(model=model, base_url=base_url, client_kwargs=pooled_client_kwargs(max_connections=64))
+    return ChatPromptTemplate.from_template(PROMPT_TEMPLATE) | llm
+
+
+def one_request(pipeline, service, answers, format_context, chain, model: str, question: str,
+                k: int | None = None) -> dict:
+    """One question the way app.py serves it; timings in seconds.
+
+    Retrieval goes through `pipeline` (coalesced with identical searches), then the
+    answer cache (`answers`, may be None), and only on a miss the generation, queued
+    behind the pipeline's semaphore and shared with identical in-flight requests.
+    """
+    from answer_cache import AnswerCache
+
+    start = time.perf_counter()
+    docs = pipeline.retrieve(service, question, k=k)
+    retrieved = time.perf_counter()
+    doc_ids = [d.id for d in docs]
+    answer = answers.get(question, doc_ids, model, service.index_version) if answers is not None else None
+    first, tokens = None, 0
+    if answer is None:
+        parts = []
+        make_inputs = lambda: {"reviews": format_context(docs, question), "question": question}
+        for token in pipeline.stream_answer(AnswerCache.key(question, doc_ids, model), chain, make_inputs):
+            if first is None:
+                first = time.perf_counter()
+            tokens += 1
+            parts.append(token)
+        if answers is not None:
+            answers.put(question, doc_ids, model, "".join(parts), service.index_version)
+    end = time.perf_counter()
+    return {"latency": end - start, "retrieve": retrieved - start,
+            "ttft": (first or end) - start, "tokens": tokens, "cached": answer is not None}
+
+
+def run_load(pipeline, service, answers, format_context, chain, model: str, questions: list[str],
+             concurrency: int = 4, k: int | None = None) -> dict:
+    """Send every question through the serving path from `concurrency` client threads."""
+    errors = []
+    coalesced = pipeline.coalesced
+
+    def task(question):
+        try:
+            return one_request(pipeline, service, answers, format_context, chain, model, question, k)
+        except Exception as e:  # counted, not fatal: the run still reports what succeeded
+            errors.append(repr(e))
+            return None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = [r for r in pool.map(task, questions) if r is not None]
+    wall = time.perf_counter() - start
+
+    summary = {"requests": len(questions), "concurrency": concurrency, "errors": len(errors),
+               "cached": sum(r["cached"] for r in results), "coalesced": pipeline.coalesced - coalesced}
+    for name in ("latency", "ttft", "retrieve"):
+        for key, value in metrics.latency([r[name] for r in results]).items():
+            summary[f"{name}_{key}"] = value
+    summary["rps"] = metrics.throughput(len(results), wall)
+    summary["tokens_per_s"] = metrics.throughput(sum(r["tokens"] for r in results), wall)
+    if errors:
+        summary["first_error"] = errors[0]
+    return summary
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Load-test retrieve -> format -> LLM against a fake (or real) Ollama")
+    ap.add_argument("--questions", default=os.path.join("rag_eval", "data", "RAGfaq.xlsx"))
+    ap.add_argument("--mix", nargs="+", default=[f"{k}={v}" for k, v in DEFAULT_MIX.items()],
+                    help="sheet=weight pairs")
+    ap.add_argument("--requests", type=int, default=100)
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[4], help="one run per value")
+    ap.add_argument("--k", type=int, default=None)
+    ap.add_argument("--context", choices=["builder", "docs"], default="builder",
+                    help="ContextBuilder (what the app sends) or format_docs (full documents)")
+    ap.add_argument("--model", default="llama3.2")
+    ap.add_argument("--max-concurrent", type=int, default=2, help="Pipeline generation slots (the app uses 2)")
+    ap.add_argument("--no-answer-cache", action="store_true", help="send every question to the LLM")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--ollama", default=None, help="real Ollama URL; default starts a FakeOllama")
+    ap.add_argument("--ttft-ms", type=float, default=200.0)
+    ap.add_argument("--tokens-per-s", type=float, default=30.0)
+    ap.add_argument("--answer-tokens", type=int, default=60)
+    ap.add_argument("--jitter", type=float, default=0.2)
+    ap.add_argument("--prefill-tokens-per-s", type=float, default=None)
+    ap.add_argument("--out", default=None, help="write the summaries as JSON")
+    ap.add_argument("--max-p95-ms", type=float, default=None, help="exit 1 if any run's p95 latency exceeds this")
+    args = ap.parse_args()
+
+    mix = {name: float(weight) for name, weight in (item.split("=", 1) for item in args.mix)}
+    questions = question_mix(args.questions, mix, args.requests, args.seed)
+
+    fake, workdir = None, None
+    if args.ollama:
+        os.environ["OLLAMA_HOST"] = args.ollama
+        from vector import service
+    else:
+        fake = FakeOllama(ttft_ms=args.ttft_ms, tokens_per_s=args.tokens_per_s, answer_tokens=args.answer_tokens,
+                          jitter=args.jitter, prefill_tokens_per_s=args.prefill_tokens_per_s, seed=args.seed).start()
+        os.environ["OLLAMA_HOST"] = fake.url
+        from vector import RetrievalService
+
+        # Throwaway index embedded by the fake server; the live index is left alone
+        workdir = tempfile.mkdtemp(prefix="loadtest_")
+        service = RetrievalService(db_location=os.path.join(workdir, "db"), cache_dir=workdir,
+                                   embed_model=FAKE_EMBED_MODEL)
+
+    try:
+        from answer_cache import AnswerCache
+        from context_builder import ContextBuilder, format_docs
+        from pipeline import Pipeline
+
+        service.warm(background=False)
+        if args.context == "builder":
+            format_context = ContextBuilder(service.df, max_tokens=1200).build
+        else:
+            format_context = lambda docs, question: format_docs(docs)
+        chain = make_chain(args.model, os.environ["OLLAMA_HOST"])
+
+        def answer_cache():
+            # Fresh per run (same settings as app.py), so runs don't answer from each other's cache
+            if args.no_answer_cache:
+                return None
+            return AnswerCache(max_entries=512, ttl_seconds=3600, embeddings=service.embeddings,
+                               similarity_threshold=0.95)
+
+        pipeline = Pipeline(max_concurrent=args.max_concurrent)
+        one_request(pipeline, service, None, format_context, chain, args.model, questions[0], args.k)  # warm-up
+        rows = []
+        for concurrency in args.concurrency:
+            rows.append(run_load(pipeline, service, answer_cache(), format_context, chain, args.model,
+                                 questions, concurrency, args.k))
+    finally:
+        if fake is not None:
+            fake.stop()
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"[load] {len(questions)} requests, mix {mix}, "
+          + ("real Ollama " + args.ollama if args.ollama else
+             f"fake Ollama ttft={args.ttft_ms}ms rate={args.tokens_per_s}tok/s jitter={args.jitter}")
+          + f", {args.max_concurrent} generation slots")
+    print_table([{key: v for key, v in row.items() if key != "first_error"} for row in rows])
+    for row in rows:
+        if "first_error" in row:
+            print(f"[warn] {row['errors']} failed requests at concurrency {row['concurrency']}: {row['first_error']}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "runs": rows}, f, indent=2)
+        print(f"[OK] Wrote {args.out}")
+    if args.max_p95_ms is not None and any(row.get("latency_p95_ms", 0) > args.max_p95_ms for row in rows):
+        print(f"[FAIL] p95 latency above {args.max_p95_ms} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# eval/metrics.py
+# Retrieval quality and latency metrics. A document is relevant when its
+# `company_code` metadata is one of the query's expected companies; rankings are
+# collapsed to company codes first, so several documents (periods, partitions) of
+# the same company count once.
+import numpy as np
+
+
+def ranked_codes(docs) -> list:
+    """Company codes of `docs` in rank order, first occurrence only."""
+    codes = []
+    for doc in docs:
+        code = doc.metadata.get("company_code")
+        if code is not None and code not in codes:
+            codes.append(code)
+    return codes
+
+
+def recall_at_k(ranked: list, relevant: set, k: int) -> float:
+    if not relevant:
+        return float("nan")
+    return len(set(ranked[:k]) & relevant) / len(relevant)
+
+
+def hit_at_k(ranked: list, relevant: set, k: int) -> float:
+    if not relevant:
+        return float("nan")
+    return float(any(code in relevant for code in ranked[:k]))
+
+
+def reciprocal_rank(ranked: list, relevant: set) -> float:
+    if not relevant:
+        return float("nan")
+    for rank, code in enumerate(ranked, 1):
+        if code in relevant:
+            return 1.0 / rank
+    return 0.0
+
+
+def quality(rankings: list[list], relevant: list[set], ks: list[int]) -> dict:
+    """Mean recall@k / hit@k per k and MRR over the queries that have an expected company."""
+    pairs = [(ranked, rel) for ranked, rel in zip(rankings, relevant) if rel]
+    if not pairs:
+        return {}
+    scores = {"mrr": float(np.mean([reciprocal_rank(r, rel) for r, rel in pairs]))}
+    for k in ks:
+        scores[f"recall@{k}"] = float(np.mean([recall_at_k(r, rel, k) for r, rel in pairs]))
+        scores[f"hit@{k}"] = float(np.mean([hit_at_k(r, rel, k) for r, rel in pairs]))
+    return scores
+
+
+def latency(samples: list[float], percentiles=(50, 95, 99)) -> dict:
+    """Per-query latency percentiles in milliseconds (`samples` in seconds)."""
+    if not samples:
+        return {}
+    values = np.percentile(samples, percentiles) * 1000
+    return {f"p{p}_ms": float(v) for p, v in zip(percentiles, values)} | {"mean_ms": float(np.mean(samples)) * 1000}
+
+
+def throughput(n: int, seconds: float) -> float:
+    return n / seconds if seconds > 0 else float("inf")
@@ -0,0 +1,60 @@
+# eval/report.py
+# Comparison tables for benchmark rows (one dict per backend / configuration).
+#
+#   python -m eval.report results/chroma.csv results/flat.csv    # combine saved runs
+import argparse
+
+import pandas as pd
+
+
+def _columns(rows: list[dict]) -> list[str]:
+    # Union of keys in first-seen order, so rows from different runs line up
+    return list(dict.fromkeys(key for row in rows for key in row))
+
+
+def _cell(value) -> str:
+    if isinstance(value, float):
+        if value != value:  # NaN
+            return "-"
+        return f"{value:.4f}" if abs(value) < 10 else f"{value:.1f}"
+    return str(value)
+
+
+def format_table(rows: list[dict], markdown: bool = False) -> str:
+    """Rows as an aligned text table (or a Markdown table)."""
+    if not rows:
+        return ""
+    header = _columns(rows)
+    cells = [[_cell(row.get(h, float("nan"))) for h in header] for row in rows]
+    if markdown:
+        lines = ["| " + " | ".join(header) + " |", "|" + "|".join("---" for _ in header) + "|"]
+        return "\n".join(lines + ["| " + " | ".join(r) + " |" for r in cells])
+    widths = [max(len(h), *(len(r[i]) for r in cells)) for i, h in enumerate(header)]
+    lines = [" | ".join(h.ljust(w) for h, w in zip(header, widths)),
+             "-+-".join("-" * w for w in widths)]
+    return "\n".join(lines + [" | ".join(c.ljust(w) for c, w in zip(r, widths)) for r in cells])
+
+
+def print_table(rows: list[dict]) -> None:
+    print(format_table(rows))
+
+
+def write_table(rows: list[dict], path: str) -> None:
+    """`.md` -> Markdown table, anything else -> CSV."""
+    if path.endswith(".md"):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(format_table(rows, markdown=True) + "\n")
+    else:
+        pd.DataFrame(rows, columns=_columns(rows)).to_csv(path, index=False)
+
+
+def read_tables(paths: list[str]) -> list[dict]:
+    return [row for path in paths for row in pd.read_csv(path).to_dict("records")]
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Combine saved benchmark tables into one comparison")
+    ap.add_argument("tables", nargs="+", help="CSV files written with --out")
+    ap.add_argument("--markdown", action="store_true")
+    args = ap.parse_args()
+    print(format_table(read_tables(args.tables), markdown=args.markdown))
@@ -0,0 +1,239 @@
+# eval/retriever_adapter.py
+# Offline retriever benchmark: runs the Query / Expected Company pairs of
+# rag_eval/data/RAGfaq.xlsx through one or more retriever backends behind a common
+# adapter interface, and measures ranking quality (eval/metrics.py), per-query
+# latency, and throughput when the queries are sent as one batch or from a pool of
+# concurrent clients. Query embeddings are dropped from the embedding cache before
+# every timed pass, so all of them start cold and are comparable; a last sequential
+# pass over the now-cached queries is reported separately (warm_*).
+#
+#   python -m eval.retriever_adapter --backends service hybrid dense bm25 --k 1 3 5 --concurrency 4
+import argparse
+import difflib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from eval import metrics
+from eval.report import print_table, write_table
+
+FAQ_PATH = os.path.join("rag_eval", "data", "RAGfaq.xlsx")
+QUERY = "Query"
+EXPECTED_COMPANY = "Expected Company"
+
+
+# ---------------- Queries ----------------
+def resolve_company(name: str, linker) -> list:
+    """Company codes for an Expected Company cell; fuzzy name match when the linker finds none."""
+    codes = linker.link(name)
+    if codes:
+        return codes
+    by_name = {n.lower(): code for code, n in linker.names.items()}
+    close = difflib.get_close_matches(name.strip().lower(), list(by_name), n=1, cutoff=0.8)
+    return [by_name[close[0]]] if close else []
+
+
+def load_queries(linker, path: str = FAQ_PATH) -> list[dict]:
+    """One {cohort, query, expected, relevant} dict per Query row of every sheet.
+
+    Rows without an Expected Company (the out-of-KB sheet) have an empty `relevant`
+    set: they count towards latency and throughput but not towards quality.
+    """
+    queries = []
+    for sheet, df in pd.read_excel(path, sheet_name=None).items():
+        if QUERY not in df.columns:
+            continue
+        for query, expected in zip(df[QUERY], df.get(EXPECTED_COMPANY, pd.Series(index=df.index, dtype=object))):
+            if pd.isna(query) or not str(query).strip():
+                continue
+            expected = "" if pd.isna(expected) else str(expected).strip()
+            relevant = set(resolve_company(expected, linker)) if expected else set()
+            if expected and not relevant:
+                print(f"[warn] {sheet}: expected company {expected!r} not in the dataset")
+            queries.append({"cohort": sheet, "query": str(query).strip(), "expected": expected, "relevant": relevant})
+    return queries
+
+
+# ---------------- Adapters ----------------
+class RetrieverAdapter:
+    """Common interface: `search(query, k)` -> ranked Documents; `search_batch` for many queries."""
+
+    name = "retriever"
+
+    def __init__(self, retriever, name: str | None = None):
+        self.retriever = retriever
+        self.name = name or self.name
+
+    def search(self, query: str, k: int) -> list:
+        return self.retriever.invoke(query, k=k, adaptive=False)
+
+    def search_batch(self, queries: list[str], k: int) -> list[list]:
+        return [self.search(q, k) for q in queries]
+
+
+class ServiceAdapter(RetrieverAdapter):
+    """The app's full path: exact company lookup, industry filters, hybrid search."""
+
+    name = "service"
+
+    def __init__(self, service, name: str | None = None, **retrieve_kwargs):
+        super().__init__(service.retriever, name)
+        self.service = service
+        self.retrieve_kwargs = retrieve_kwargs
+
+    def search(self, query: str, k: int) -> list:
+        return self.service.retrieve(query, k=k, adaptive=False, **self.retrieve_kwargs)
+
+    def search_batch(self, queries: list[str], k: int) -> list[list]:
+        # One embedding call for every query, as batch_qa does; searches then hit the cache
+        self.service.embeddings.embed_documents(list(dict.fromkeys(queries)))
+        return super().search_batch(queries, k)
+
+
+class DenseAdapter(RetrieverAdapter):
+    """Vector search only (Chroma or FlatVectorStore)."""
+
+    name = "dense"
+
+    def __init__(self, vector_store, embeddings, name: str | None = None):
+        super().__init__(None, name)
+        self.vector_store = vector_store
+        self.embeddings = embeddings
+
+    def _by_vector(self, vector, k: int) -> list:
+        hits = self.vector_store.similarity_search_by_vector_with_relevance_scores(vector, k=k)
+        return [doc for doc, _ in hits]
+
+    def search(self, query: str, k: int) -> list:
+        return self._by_vector(self.embeddings.embed_query(query), k)
+
+    def search_batch(self, queries: list[str], k: int) -> list[list]:
+        vectors = self.embeddings.embed_documents(queries)
+        return [self._by_vector(v, k) for v in vectors]
+
+
+class LexicalAdapter(RetrieverAdapter):
+    """BM25 only."""
+
+    name = "bm25"
+
+    def __init__(self, lexical, name: str | None = None):
+        super().__init__(None, name)
+        self.lexical = lexical
+
+    def search(self, query: str, k: int) -> list:
+        return [doc for doc, _ in self.lexical.search(query, k=k)]
+
+
+def service_adapters(service, names: list[str]) -> list[RetrieverAdapter]:
+    """Adapters over the legs of one (warmed) RetrievalService."""
+    service.warm(background=False)
+    available = {
+        "service": lambda: ServiceAdapter(service),
+        "hybrid": lambda: RetrieverAdapter(service.retriever, "hybrid"),
+    }
+    if not service.partition_by:
+        # Partitioned services only expose the fan-out retriever
+        available["dense"] = lambda: DenseAdapter(service.vector_store, service.embeddings)
+        available["bm25"] = lambda: LexicalAdapter(service._lexical)
+    unknown = [n for n in names if n not in available]
+    if unknown:
+        raise ValueError(f"Unknown or unavailable backends {unknown}; choose from {list(available)}")
+    return [available[n]() for n in names]
+
+
+# ---------------- Benchmark ----------------
+def _sequential(adapter: RetrieverAdapter, texts: list[str], k: int) -> tuple[list[float], list[list]]:
+    latencies, rankings = [], []
+    for text in texts:
+        start = time.perf_counter()
+        docs = adapter.search(text, k)
+        latencies.append(time.perf_counter() - start)
+        rankings.append(metrics.ranked_codes(docs))
+    return latencies, rankings
+
+
+def benchmark(adapter: RetrieverAdapter, queries: list[dict], ks: list[int] = (1, 3, 5),
+              concurrency: int = 4, cache=None) -> dict:
+    """Quality at each k, sequential latency percentiles, batched and concurrent throughput.
+
+    `cache` (a CachedEmbeddings) has the query vectors dropped before each timed
+    pass, so sequential, batch and concurrent runs all pay the same embedding
+    calls; warm_* columns repeat the sequential pass with every query cached.
+    """
+    ks = sorted(set(ks))
+    texts = [q["query"] for q in queries]
+    top = ks[-1]
+
+    def cold():
+        if cache is not None:
+            cache.forget(texts)
+
+    adapter.search(texts[0], top)  # warm-up: lazy loads, connection setup
+
+    cold()
+    latencies, rankings = _sequential(adapter, texts, top)
+
+    cold()
+    start = time.perf_counter()
+    adapter.search_batch(texts, top)
+    batch_s = time.perf_counter() - start
+
+    cold()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda text: adapter.search(text, top), texts))
+    concurrent_s = time.perf_counter() - start
+
+    warm, _ = _sequential(adapter, texts, top)
+
+    row = {"backend": adapter.name, "queries": len(texts)}
+    row.update(metrics.quality(rankings, [q["relevant"] for q in queries], ks))
+    row.update(metrics.latency(latencies))
+    row["seq_qps"] = metrics.throughput(len(texts), sum(latencies))
+    row["batch_qps"] = metrics.throughput(len(texts), batch_s)
+    row[f"concurrent{concurrency}_qps"] = metrics.throughput(len(texts), concurrent_s)
+    row.update({f"warm_{key}": value for key, value in metrics.latency(warm, (50, 95)).items() if key != "mean_ms"})
+    row["warm_seq_qps"] = metrics.throughput(len(texts), sum(warm))
+    return row
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark retriever backends on the RAGfaq queries")
+    ap.add_argument("--faq", default=FAQ_PATH)
+    ap.add_argument("--backends", nargs="+", default=["service", "hybrid", "dense", "bm25"])
+    ap.add_argument("--k", nargs="+", type=int, default=[1, 3, 5])
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--repeat", type=int, default=1, help="run the query set this many times")
+    ap.add_argument("--vector-backend", choices=["chroma", "flat"], default=None,
+                    help="benchmark a fresh RetrievalService with this store instead of the live one")
+    ap.add_argument("--db", default=None, help="db_location for --vector-backend")
+    ap.add_argument("--partition-by", choices=["period", "industry"], default=None)
+    ap.add_argument("--out", default=None, help="also write the table (.csv or .md)")
+    args = ap.parse_args()
+
+    from vector import RetrievalService, service
+
+    if args.vector_backend or args.partition_by:
+        kwargs = {"backend": args.vector_backend or "chroma", "partition_by": args.partition_by}
+        if args.db:
+            kwargs["db_location"] = args.db
+        service = RetrievalService(**kwargs)
+
+    adapters = service_adapters(service, args.backends)
+    queries = load_queries(service.linker, args.faq) * args.repeat
+    print(f"[bench] {len(queries)} queries ({sum(bool(q['relevant']) for q in queries)} with an expected company)")
+    # Only a CachedEmbeddings can be reset between passes (see benchmark)
+    cache = service.embeddings if hasattr(service.embeddings, "forget") else None
+    rows = [benchmark(adapter, queries, args.k, args.concurrency, cache) for adapter in adapters]
+
+    print_table(rows)
+    if args.out:
+        write_table(rows, args.out)
+        print(f"[OK] Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# filters.py
+# Metadata filters for retrieval, in Chroma's `where` syntax so the same dict can be
+# pushed down to Chroma, FlatVectorStore and the BM25 index:
+#
+#   {"industry": "Materials"}
+#   {"company_code": {"$in": ["BHP", "RIO"]}}
+#   {"$and": [{"industry": {"$in": [...]}}, {"company_code": {"$in": [...]}}]}
+import numpy as np
+
+FILTER_FIELDS = ("company_code", "industry", "period")
+
+
+def build_filter(industries=None, codes=None, periods=None) -> dict | None:
+    """Where-clause restricting to any of `industries`, `codes` and `periods`; None if none given."""
+    clauses = []
+    if industries:
+        clauses.append({"industry": {"$in": list(industries)}})
+    if codes:
+        clauses.append({"company_code": {"$in": [str(c) for c in codes]}})
+    if periods:
+        clauses.append({"period": {"$in": list(periods)}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def filter_values(where: dict | None, field: str) -> list | None:
+    """Values a where-clause allows for `field` (None when it does not constrain it)."""
+    if not where:
+        return None
+    if "$and" in where:
+        found = [v for clause in where["$and"] if (v := filter_values(clause, field)) is not None]
+        return found[0] if found else None
+    if field not in where:
+        return None
+    cond = where[field]
+    return list(cond["$in"]) if isinstance(cond, dict) else [cond]
+
+
+def metadata_columns(metadatas: list[dict]) -> dict[str, np.ndarray]:
+    # Parallel metadata arrays for vectorised pre-filtering
+    return {
+        field: np.array([str((m or {}).get(field, "")) for m in metadatas], dtype=object)
+        for field in FILTER_FIELDS
+    }
+
+
+def filter_mask(columns: dict[str, np.ndarray], where: dict | None, size: int) -> np.ndarray | None:
+    """Boolean row mask for a where-clause over `metadata_columns`; None means no filter."""
+    if not where:
+        return None
+    mask = np.ones(size, dtype=bool)
+    for field, cond in where.items():
+        if field == "$and":
+            for clause in cond:
+                mask &= filter_mask(columns, clause, size)
+            continue
+        if field not in columns:
+            raise ValueError(f"Can only filter on {FILTER_FIELDS}, got {field!r}")
+        allowed = cond["$in"] if isinstance(cond, dict) else [cond]
+        mask &= np.isin(columns[field], [str(a) for a in allowed])
+    return mask
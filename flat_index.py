@@ -0,0 +1,213 @@
+# flat_index.py
+# Brute-force vector store for small corpora: normalised embeddings in a memory-mapped
+# float16 (or int8 + per-row scale) NumPy file, with a parallel metadata array.
+#
+# For a few thousand company documents an exact matrix product is cheaper than
+# Chroma's client, SQLite layer and HNSW graph, loads instantly and never misses a
+# neighbour. It implements the parts of the Chroma surface the rest of the app uses
+# (get / delete / similarity_search_with_score / as_retriever), so RetrievalService
+# can switch backends with `backend="flat"`.
+import json
+import os
+import threading
+from typing import Any, Iterable
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from filters import filter_mask, metadata_columns
+
+# Rows upcast to float32 at a time while scoring, so a query never materialises the whole matrix
+BLOCK_ROWS = 1024
+
+
+class FlatVectorStore(VectorStore):
+    def __init__(self, persist_directory: str, embedding_function: Embeddings, dtype: str = "float16"):
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"dtype must be 'float16' or 'int8', got {dtype!r}")
+        self.persist_directory = persist_directory
+        self._embeddings = embedding_function
+        self.dtype = dtype
+        self._lock = threading.Lock()
+
+        self.ids: list[str] = []
+        self.texts: list[str] = []
+        self.metadatas: list[dict] = []
+        self._vectors = np.zeros((0, 0), dtype=dtype)
+        self._scales = np.ones(0, dtype=np.float32)
+        self._build_filters()
+        self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embeddings
+
+    # ---------------- Persistence ----------------
+    def _path(self, name: str) -> str:
+        return os.path.join(self.persist_directory, name)
+
+    def _load(self) -> None:
+        meta_path = self._path("flat_meta.json")
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["dtype"] != self.dtype:
+            raise ValueError(f"{self.persist_directory} holds {meta['dtype']} vectors, not {self.dtype}")
+        self.ids, self.texts, self.metadatas = meta["ids"], meta["texts"], meta["metadatas"]
+        # Memory-mapped: nothing is read until a query touches it
+        self._vectors = np.load(self._path("flat_vectors.npy"), mmap_mode="r")
+        self._scales = np.load(self._path("flat_scales.npy"), mmap_mode="r")
+        self._build_filters()
+
+    def _persist(self) -> None:
+        os.makedirs(self.persist_directory, exist_ok=True)
+        for name, array in (("flat_vectors.npy", self._vectors), ("flat_scales.npy", self._scales)):
+            tmp = self._path(name + ".tmp.npy")
+            np.save(tmp, np.ascontiguousarray(array))
+            os.replace(tmp, self._path(name))
+        tmp = self._path("flat_meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"dtype": self.dtype, "ids": self.ids, "texts": self.texts,
+                       "metadatas": self.metadatas}, f, default=str)
+        os.replace(tmp, self._path("flat_meta.json"))
+
+    def _build_filters(self) -> None:
+        self._fields = metadata_columns(self.metadatas)
+
+    # ---------------- Encoding ----------------
+    def _encode(self, vectors) -> tuple[np.ndarray, np.ndarray]:
+        v = np.asarray(vectors, dtype=np.float32)
+        v = v / np.maximum(np.linalg.norm(v, axis=1, keepdims=True), 1e-12)
+        if self.dtype == "float16":
+            return v.astype(np.float16), np.ones(len(v), dtype=np.float32)
+        scales = np.maximum(np.abs(v).max(axis=1), 1e-12) / 127.0
+        return np.round(v / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    # ---------------- Writes ----------------
+    def upsert_embeddings(self, ids: list[str], embeddings, texts: list[str], metadatas: list[dict]) -> None:
+        encoded, scales = self._encode(embeddings)
+        with self._lock:
+            vectors = np.array(self._vectors) if len(self.ids) else np.zeros((0, encoded.shape[1]), dtype=encoded.dtype)
+            all_scales = np.array(self._scales)
+            position = {doc_id: i for i, doc_id in enumerate(self.ids)}
+            new_rows = []
+            for j, doc_id in enumerate(ids):
+                i = position.get(doc_id)
+                if i is None:
+                    new_rows.append(j)
+                    continue
+                vectors[i], all_scales[i] = encoded[j], scales[j]
+                self.texts[i], self.metadatas[i] = texts[j], metadatas[j]
+            if new_rows:
+                vectors = np.vstack([vectors, encoded[new_rows]])
+                all_scales = np.concatenate([all_scales, scales[new_rows]])
+                self.ids += [ids[j] for j in new_rows]
+                self.texts += [texts[j] for j in new_rows]
+                self.metadatas += [metadatas[j] for j in new_rows]
+            self._vectors, self._scales = vectors, all_scales
+            self._build_filters()
+            self._persist()
+
+    def add_texts(self, texts: Iterable[str], metadatas: list[dict] | None = None,
+                  ids: list[str] | None = None, **kwargs: Any) -> list[str]:
+        texts = list(texts)
+        ids = ids or [str(len(self.ids) + i) for i in range(len(texts))]
+        metadatas = metadatas or [{} for _ in texts]
+        self.upsert_embeddings(ids, self._embeddings.embed_documents(texts), texts, metadatas)
+        return ids
+
+    def delete(self, ids: list[str] | None = None, **kwargs: Any) -> None:
+        if not ids:
+            return
+        drop = set(ids)
+        with self._lock:
+            keep = [i for i, doc_id in enumerate(self.ids) if doc_id not in drop]
+            self._vectors = np.array(self._vectors)[keep]
+            self._scales = np.array(self._scales)[keep]
+            self.ids = [self.ids[i] for i in keep]
+            self.texts = [self.texts[i] for i in keep]
+            self.metadatas = [self.metadatas[i] for i in keep]
+            self._build_filters()
+            self._persist()
+
+    # ---------------- Reads ----------------
+    def _mask(self, where: dict | None) -> np.ndarray | None:
+        return filter_mask(self._fields, where, len(self.ids))
+
+    def get(self, ids: list[str] | None = None, where: dict | None = None, include=None, **kwargs: Any) -> dict:
+        rows = range(len(self.ids))
+        if ids is not None:
+            wanted = set(ids)
+            rows = [i for i in rows if self.ids[i] in wanted]
+        mask = self._mask(where)
+        if mask is not None:
+            rows = [i for i in rows if mask[i]]
+        return {
+            "ids": [self.ids[i] for i in rows],
+            "documents": [self.texts[i] for i in rows],
+            "metadatas": [self.metadatas[i] for i in rows],
+        }
+
+    def search_by_vectors(self, queries, k: int = 4, filter: dict | None = None) -> list[list[tuple[int, float]]]:
+        """Exact top-k for a batch of query vectors: [(row, cosine similarity), ...] per query."""
+        if not self.ids:
+            return [[] for _ in range(len(queries))]
+        q = np.asarray(queries, dtype=np.float32)
+        q = q / np.maximum(np.linalg.norm(q, axis=1, keepdims=True), 1e-12)
+
+        mask = self._mask(filter)
+        rows = np.flatnonzero(mask) if mask is not None else np.arange(len(self.ids))
+        if len(rows) == 0:
+            return [[] for _ in range(len(q))]
+        vectors = self._vectors if mask is None else self._vectors[rows]
+        scales = self._scales if mask is None else self._scales[rows]
+        sims = np.empty((len(q), len(rows)), dtype=np.float32)
+        for start in range(0, len(rows), BLOCK_ROWS):
+            block = slice(start, start + BLOCK_ROWS)
+            np.matmul(q, vectors[block].astype(np.float32).T, out=sims[:, block])
+        sims *= np.asarray(scales, dtype=np.float32)[None, :]
+
+        k = min(k, len(rows))
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        results = []
+        for qi, cand in enumerate(top):
+            order = cand[np.argsort(-sims[qi, cand])]
+            results.append([(int(rows[j]), float(sims[qi, j])) for j in order])
+        return results
+
+    def _document(self, row: int) -> Document:
+        return Document(page_content=self.texts[row], metadata=self.metadatas[row], id=self.ids[row])
+
+    def similarity_search_by_vector_with_score(self, embedding, k: int = 4, filter: dict | None = None,
+                                               **kwargs: Any) -> list[tuple[Document, float]]:
+        # Cosine distance, so lower is better like Chroma's scores
+        (hits,) = self.search_by_vectors([embedding], k, filter)
+        return [(self._document(row), 1.0 - sim) for row, sim in hits]
+
+    # Chroma's name for the same call (it also returns distances, despite the name)
+    similarity_search_by_vector_with_relevance_scores = similarity_search_by_vector_with_score
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: dict | None = None,
+                                     **kwargs: Any) -> list[tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embeddings.embed_query(query), k, filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: dict | None = None, **kwargs: Any) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, filter: dict | None = None,
+                                    **kwargs: Any) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        return lambda distance: 1.0 - distance
+
+    @classmethod
+    def from_texts(cls, texts: list[str], embedding: Embeddings, metadatas: list[dict] | None = None,
+                   ids: list[str] | None = None, persist_directory: str = "./flat_company_db",
+                   **kwargs: Any) -> "FlatVectorStore":
+        store = cls(persist_directory, embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
@@ -0,0 +1,187 @@
+# ingest.py
+# Builds / refreshes the Chroma collection from the company DataFrame.
+#
+# Pipeline: render all rows at once -> diff against the manifest -> embed changed
+# documents in batches with several requests in flight -> upsert each batch and
+# checkpoint it in the manifest. Re-running after a crash only redoes the batches
+# that were not checkpointed.
+import hashlib
+import json
+import os
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from langchain_core.documents import Document
+
+from entity_linker import clean_industry
+from lexical import BM25Index
+from schema import CODE, DOCUMENT_FIELDS, INDUSTRY, NAME, PERIOD_FIELDS, PROFILE, PROFILE_FIELDS
+
+MANIFEST_NAME = "manifest.json"
+
+
+# ---------------- Rendering ----------------
+def _as_text(col: pd.Series) -> pd.Series:
+    # Same text an f-string would produce, including "nan" for blanks
+    return col.astype(str).fillna("nan")
+
+
+def render_documents(df: pd.DataFrame, fields: list[tuple[str, str]] = DOCUMENT_FIELDS,
+                     header: str | None = None) -> pd.Series:
+    """Render every row to its document text with column-wise string ops."""
+    text = "Company: " + _as_text(df[NAME]) + " (Code: " + _as_text(df[CODE]) + ")"
+    if header:
+        text = text + "\n" + header
+    for label, column in fields:
+        text = text + "\n" + label + ": " + _as_text(df[column])
+    return text
+
+
+def document_ids(df: pd.DataFrame) -> pd.Series:
+    # One document per company, keyed by its ASX code so ids survive row re-ordering
+    codes = df[CODE].astype(str).str.strip()
+    return codes.where(df[CODE].notna(), pd.Series(df.index, index=df.index).astype(str))
+
+
+def build_documents(df: pd.DataFrame) -> list[Document]:
+    texts = render_documents(df)
+    ids = document_ids(df)
+    # Cleaned industry names, so metadata filters match IndustryLinker output exactly
+    industries = df[INDUSTRY].map(clean_industry)
+    return [
+        Document(page_content=text, metadata={"company_code": code, "industry": industry}, id=doc_id)
+        for doc_id, text, code, industry in zip(ids, texts, df[CODE], industries)
+    ]
+
+
+def build_period_documents(df: pd.DataFrame) -> list[Document]:
+    """One document per company per reporting period (PERIOD_FIELDS), plus a profile document.
+
+    Ids are "<code>:<period>" and the period key is stored in the `period` metadata.
+    """
+    labels = {column: label for label, column in DOCUMENT_FIELDS}
+    ids = document_ids(df)
+    industries = df[INDUSTRY].map(clean_industry)
+    sections = {PROFILE: ("Profile", PROFILE_FIELDS), **PERIOD_FIELDS}
+    documents = []
+    for period, (title, columns) in sections.items():
+        texts = render_documents(df, [(labels[c], c) for c in columns], header=f"Period: {title}")
+        documents += [
+            Document(page_content=text, id=f"{doc_id}:{period}",
+                     metadata={"company_code": code, "industry": industry, "period": period})
+            for doc_id, text, code, industry in zip(ids, texts, df[CODE], industries)
+        ]
+    return documents
+
+
+# ---------------- Manifest ----------------
+def document_hash(doc: Document) -> str:
+    # Hash of everything that ends up in the collection for this row
+    payload = json.dumps(
+        {"text": doc.page_content, "metadata": doc.metadata},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_manifest(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def manifest_version(path: str) -> str:
+    """Short hash identifying the indexed content; changes whenever any row does."""
+    payload = json.dumps(load_manifest(path), sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def save_manifest(manifest: dict, path: str) -> None:
+    # Write to a temp file first so a crash never leaves a half-written manifest
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+# ---------------- Embedding + writing ----------------
+def iter_batches(items: list, batch_size: int):
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+def embed_in_batches(embeddings, documents: list[Document], batch_size: int = 32, max_workers: int = 4):
+    """Yield (batch, vectors) in order, keeping up to `max_workers` embedding calls in flight."""
+    batches = list(iter_batches(documents, batch_size))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = []
+        for batch in batches:
+            pending.append((batch, pool.submit(embeddings.embed_documents, [d.page_content for d in batch])))
+            if len(pending) >= max_workers:
+                batch0, fut = pending.pop(0)
+                yield batch0, fut.result()
+        for batch0, fut in pending:
+            yield batch0, fut.result()
+
+
+def upsert_batch(store, batch: list[Document], vectors: list[list[float]]) -> None:
+    # Vectors are already computed; FlatVectorStore and vector.py's Chroma adapter both take them as is
+    store.upsert_embeddings([d.id for d in batch], vectors, [d.page_content for d in batch],
+                            [d.metadata for d in batch])
+
+
+def sync_index(
+    store,
+    embeddings,
+    documents: list[Document],
+    manifest_path: str,
+    batch_size: int = 32,
+    max_workers: int = 4,
+    progress: Callable[[int, int], None] | None = None,
+) -> dict:
+    """Upsert changed rows and delete removed ones, based on the manifest hashes.
+
+    `progress(done, total)` is called after each embedded batch.
+    """
+    old = load_manifest(manifest_path)
+    if not old:
+        # No manifest yet (fresh DB or one built before manifests existed):
+        # treat whatever is already in the collection as unknown/stale.
+        old = {doc_id: None for doc_id in store.get(include=[])["ids"]}
+
+    new = {doc.id: document_hash(doc) for doc in documents}
+    changed = [doc for doc in documents if old.get(doc.id) != new[doc.id]]
+    removed = [doc_id for doc_id in old if doc_id not in new]
+
+    # The manifest doubles as the resume checkpoint: it only ever lists rows
+    # whose current content is actually in the collection.
+    manifest = {doc_id: h for doc_id, h in old.items() if h is not None and new.get(doc_id) == h}
+    if removed:
+        store.delete(ids=removed)
+    save_manifest(manifest, manifest_path)
+
+    done = 0
+    for batch, vectors in embed_in_batches(embeddings, changed, batch_size, max_workers):
+        upsert_batch(store, batch, vectors)
+        manifest.update({doc.id: new[doc.id] for doc in batch})
+        save_manifest(manifest, manifest_path)
+        done += len(batch)
+        if progress is not None:
+            progress(done, len(changed))
+
+    return {
+        "upserted": len(changed),
+        "deleted": len(removed),
+        "unchanged": len(documents) - len(changed),
+    }
+
+
+def build_lexical_index(documents: list[Document], path: str) -> BM25Index:
+    """Rebuild and persist the BM25 index next to the collection (cheap, no embedding)."""
+    index = BM25Index.from_documents(documents)
+    index.save(path)
+    return index
@@ -0,0 +1,237 @@
+# lexical.py
+# In-process BM25 index over the rendered company documents, plus a retriever that
+# fuses it with dense (Chroma) results using reciprocal rank fusion, or score fusion
+# (blended relevance) with an adaptive cut-off when `adaptive` is on.
+import json
+import logging
+import math
+import os
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from filters import filter_mask, metadata_columns
+
+LEXICAL_NAME = "bm25.json"
+
+# Keeps tickers, decimals ("81023.58") and hyphenated names ("hi-fi") as single tokens
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.\-][a-z0-9]+)*")
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hybrid")
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed set of documents, stored as per-term postings."""
+
+    def __init__(self, ids: list[str], texts: list[str], metadatas: list[dict], k1: float = 1.5, b: float = 0.75):
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.k1 = k1
+        self.b = b
+
+        tokenized = [tokenize(t) for t in texts]
+        self.doc_len = np.array([len(toks) for toks in tokenized], dtype=np.float32)
+        self.avg_len = float(self.doc_len.mean()) if len(tokenized) else 0.0
+
+        postings: dict[str, list[tuple[int, int]]] = {}
+        for i, toks in enumerate(tokenized):
+            for term, tf in Counter(toks).items():
+                postings.setdefault(term, []).append((i, tf))
+        n = len(tokenized)
+        self.postings = {
+            term: (np.array([i for i, _ in p], dtype=np.int32), np.array([tf for _, tf in p], dtype=np.float32))
+            for term, p in postings.items()
+        }
+        self.idf = {term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for term, p in postings.items()}
+        self._fields = metadata_columns(metadatas)
+
+    @classmethod
+    def from_documents(cls, documents: list[Document]) -> "BM25Index":
+        return cls(
+            [d.id for d in documents],
+            [d.page_content for d in documents],
+            [d.metadata for d in documents],
+        )
+
+    def save(self, path: str) -> None:
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "texts": self.texts, "metadatas": self.metadatas,
+                       "k1": self.k1, "b": self.b}, f, default=str)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["ids"], data["texts"], data["metadatas"], data["k1"], data["b"])
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len / (self.avg_len or 1.0))
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            idx, tf = self.postings[term]
+            scores[idx] += self.idf[term] * tf * (self.k1 + 1) / (tf + norm[idx])
+        return scores
+
+    def search(self, query: str, k: int = 5, filter: dict | None = None) -> list[tuple[Document, float]]:
+        scores = self.scores(query)
+        mask = filter_mask(self._fields, filter, len(self.ids))
+        if mask is not None:
+            scores[~mask] = 0.0
+        top = np.argsort(-scores)[:k]
+        return [(self.document(i), float(scores[i])) for i in top if scores[i] > 0]
+
+    def document(self, i: int) -> Document:
+        return Document(page_content=self.texts[i], metadata=self.metadatas[i], id=self.ids[i])
+
+
+def reciprocal_rank_fusion(rankings: list[list[Document]], k: int = 60) -> list[Document]:
+    """Merge ranked lists: each doc scores sum(1 / (k + rank)) over the lists it appears in."""
+    fused: dict[str, float] = {}
+    docs: dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, 1):
+            fused[doc.id] = fused.get(doc.id, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(doc.id, doc)
+    return [docs[doc_id] for doc_id in sorted(fused, key=fused.get, reverse=True)]
+
+
+def score_fusion(dense: list[tuple[Document, float]], lexical: list[tuple[Document, float]],
+                 alpha: float = 0.5) -> list[tuple[Document, float]]:
+    """Blend dense relevance (0..1) with max-normalised BM25; returns (doc, score) best first."""
+    top_bm25 = max((score for _, score in lexical), default=0.0) or 1.0
+    scores: dict[str, float] = {}
+    docs: dict[str, Document] = {}
+    for doc, score in dense:
+        scores[doc.id] = scores.get(doc.id, 0.0) + alpha * score
+        docs.setdefault(doc.id, doc)
+    for doc, score in lexical:
+        scores[doc.id] = scores.get(doc.id, 0.0) + (1 - alpha) * score / top_bm25
+        docs.setdefault(doc.id, doc)
+    return [(docs[i], scores[i]) for i in sorted(scores, key=scores.get, reverse=True)]
+
+
+def adaptive_cut(scores: list[float], min_k: int, max_k: int, max_gap: float = 0.25,
+                 cumulative: float = 0.8) -> int:
+    """How many of the (descending) scores to keep.
+
+    Stops at the first drop bigger than `max_gap` x the top score, or once the kept
+    scores reach `cumulative` of the total relevance, always keeping min_k..max_k.
+    """
+    n = min(len(scores), max_k)
+    if n <= min_k:
+        return n
+    total = sum(max(s, 0.0) for s in scores[:n]) or 1.0
+    kept = sum(max(s, 0.0) for s in scores[:min_k])
+    for i in range(min_k, n):
+        if scores[i - 1] - scores[i] > max_gap * scores[0]:
+            return i
+        if kept / total >= cumulative:
+            return i
+        kept += max(scores[i], 0.0)
+    return n
+
+
+class HybridRetriever(BaseRetriever):
+    """BM25 + dense retrieval fused with reciprocal rank fusion.
+
+    Both legs run concurrently. With `skip_dense_ratio` set, the dense leg is started
+    speculatively and dropped (cancelled if it hasn't started, otherwise not waited
+    for) when the best BM25 score is at least `skip_dense_min_score` and beats the
+    runner-up by that factor.
+
+    `fusion="score"` ranks by blended dense/BM25 scores (see `score_fusion`) instead
+    of RRF. With `adaptive` on, candidates are always ranked by the blended scores,
+    since those are what `adaptive_cut` reads, and the list is cut where relevance
+    drops off, between `min_k` and `k`. `k` and `adaptive` can be overridden per
+    call: `invoke(q, k=3)`.
+
+    `filter` (a where-clause, see filters.py) restricts both legs to matching
+    documents before scoring: `invoke(q, filter={"industry": "Materials"})`.
+    `query_embedding` (a zero-argument callable) supplies a precomputed query
+    vector, e.g. one shared across partitions.
+    """
+
+    vector_store: Any
+    lexical: Any
+    k: int = 5
+    fetch_k: int = 20
+    rrf_k: int = 60
+    fusion: str = "rrf"  # "rrf" | "score"
+    skip_dense_ratio: float | None = None
+    skip_dense_min_score: float = 5.0
+    adaptive: bool = False
+    min_k: int = 1
+    max_gap: float = 0.25
+    cumulative: float = 0.8
+    alpha: float = 0.5
+
+    def _dense(self, query: str, filter: dict | None = None, query_embedding=None) -> list[tuple[Document, float]]:
+        # Map raw distances to (0, 1] ourselves: Chroma's default l2 relevance
+        # function goes negative for unnormalised embeddings.
+        if query_embedding is not None:
+            # Both backends return distances from this call, despite its name
+            hits = self.vector_store.similarity_search_by_vector_with_relevance_scores(
+                query_embedding(), k=self.fetch_k, filter=filter)
+        else:
+            hits = self.vector_store.similarity_search_with_score(query, k=self.fetch_k, filter=filter)
+        return [(doc, 1.0 / (1.0 + distance)) for doc, distance in hits]
+
+    def candidates(self, query: str, filter: dict | None = None,
+                   query_embedding=None) -> tuple[list[tuple[Document, float]], list[tuple[Document, float]]]:
+        """(dense, lexical) hits with their scores, before fusion; dense is empty when BM25 is confident."""
+        dense_future = _executor.submit(self._dense, query, filter, query_embedding)
+        lexical_hits = self.lexical.search(query, k=self.fetch_k, filter=filter)
+        if self.skip_dense_ratio is not None and self._confident(lexical_hits):
+            dense_future.cancel()
+            return [], lexical_hits
+        return dense_future.result(), lexical_hits
+
+    def rank(self, dense_hits: list[tuple[Document, float]], lexical_hits: list[tuple[Document, float]],
+             k: int | None = None, adaptive: bool | None = None, query: str = "") -> list[Document]:
+        """Fuse candidate lists (from one or several indexes) and keep the top `k`, or the adaptive cut."""
+        k = k or self.k
+        adaptive = self.adaptive if adaptive is None else adaptive
+        if adaptive or self.fusion == "score":
+            ranked = score_fusion(dense_hits, lexical_hits, alpha=self.alpha)
+            chosen = k
+            if adaptive:
+                # Cut the same list the scores came from
+                chosen = adaptive_cut([score for _, score in ranked], min(self.min_k, k), k,
+                                      self.max_gap, self.cumulative)
+                logger.info("adaptive k=%d of %d candidates (max %d) for %r", chosen, len(ranked), k, query)
+            return [doc for doc, _ in ranked[:chosen]]
+
+        # Sorted by score, so lists pooled from several indexes rank globally
+        rankings = [[doc for doc, _ in sorted(hits, key=lambda hit: hit[1], reverse=True)]
+                    for hits in (dense_hits, lexical_hits)]
+        return reciprocal_rank_fusion(rankings, k=self.rrf_k)[:k]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+                                k: int | None = None, adaptive: bool | None = None,
+                                filter: dict | None = None, query_embedding=None) -> list[Document]:
+        dense_hits, lexical_hits = self.candidates(query, filter, query_embedding)
+        return self.rank(dense_hits, lexical_hits, k=k, adaptive=adaptive, query=query)
+
+    def _confident(self, hits: list[tuple[Document, float]]) -> bool:
+        if not hits or hits[0][1] < self.skip_dense_min_score:
+            return False
+        if len(hits) == 1:
+            return True
+        return hits[0][1] >= self.skip_dense_ratio * hits[1][1]
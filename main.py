@@ -1,68 +1,104 @@
+import argparse
+import io
+import sys
+
 from langchain_ollama.llms import OllamaLLM
 from langchain_core.prompts import ChatPromptTemplate
-from vector import retriever, df
+from vector import service
+from answer_cache import AnswerCache
+from query_engine import QueryEngine
+from context_builder import PROMPT_TEMPLATE, ContextBuilder
+from charts import ChartService
+from tracing import format_breakdown, tracer
 import matplotlib.pyplot as plt
 
-model = OllamaLLM(model="llama3.2")
-
-template = """
-You are an expert financial analyst. 
-Answer the question based on the company financial reports below.
-
-Here are some relevant company records:{reviews}
-
-Here is the question to answer: {question}
+# python main.py                       -> interactive questions
+# python main.py --batch FILE --out OUT -> answer every question in FILE (see batch_qa.py)
+parser = argparse.ArgumentParser()
+parser.add_argument("--batch", help="questions file (RAGfaq-style .xlsx, or one question per line)")
+parser.add_argument("--out", default="rag_eval/data/RAGfaq_generated.xlsx", help="batch output workbook")
+parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5], help="retrieval depths to answer at")
+parser.add_argument("--workers", type=int, default=2, help="parallel generation requests")
+parser.add_argument("--model", default="llama3.2")
+parser.add_argument("--timings", action="store_true", help="print each question's per-stage timings")
+args = parser.parse_args()
 
-If the questions is not relevant to financial reports, please reply accordingly.
-"""
+model = OllamaLLM(model=args.model)
 
-prompt = ChatPromptTemplate.from_template(template)
+prompt = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
 chain = prompt | model
 
+# Load the dataset and vector store up front; the CLI needs both anyway
+service.progress = lambda done, total: print(f"[ingest] {done}/{total} documents embedded")
+service.warm(background=False)
+df = service.df
+engine = QueryEngine(df)
+context = ContextBuilder(df, max_tokens=1200)
+charts = ChartService(df)
+answers = AnswerCache(embeddings=service.embeddings, similarity_threshold=0.95)
+print("Index ready: " + ", ".join(f"{stage} {secs:.2f}s" for stage, secs in service.timings.items()))
+
+if args.batch:
+    from batch_qa import run_batch
+
+    run_batch(args.batch, args.out, service, context, chain, args.model, PROMPT_TEMPLATE, ks=args.k, workers=args.workers)
+    sys.exit(0)
+
+
+# ---------------- Charts ----------------
+def show_chart(png: bytes) -> None:
+    # The chart is rendered (and cached) by charts.ChartService; pyplot only displays it
+    plt.figure(figsize=(8, 5))
+    plt.imshow(plt.imread(io.BytesIO(png), format="png"))
+    plt.axis("off")
+    plt.show()
+
 
-# ---------------- Chart Function ----------------
-def plot_revenue(df, question: str, company: str = None):
-    if company:
-        data = df[df["Company name"].str.contains(company, case=False)]
-        if data.empty:
-            print(f"No data found for {company}")
-            return
+def answer(question: str, trace) -> None:
+    """Answer one question, timing each stage into `trace`."""
+    # Chart detection
+    if any(k in question.lower() for k in ["chart", "plot", "graph", "visualize"]):
+        trace.kind = "chart"
+        print("Chart branch triggered!")
+        mentioned = service.linker.link(question)
+        with trace.span("plot"):
+            png = charts.chart(question, mentioned)
+        if png is None:
+            print("No chart data found for that request")
+        else:
+            show_chart(png)
+        return
+
+
+
+    # Rank / filter / aggregate questions are answered straight from the DataFrame
+    with trace.span("structured"):
+        structured = engine.answer(question)
+    if structured is not None:
+        trace.kind = "structured"
+        print(structured.to_markdown())
+        return
+
+    trace.kind = "rag"
+    with trace.span("retrieve"):
+        docs = service.retrieve(question)
+    doc_ids = [d.id for d in docs]
+    with trace.span("answer_cache"):
+        result = answers.get(question, doc_ids, args.model, service.index_version)
+    if result is None:
+        # Print tokens as they arrive instead of waiting for the whole answer
+        with trace.span("format"):
+            reviews = context.build(docs, question)
+        parts = []
+        for chunk in trace.stream("llm", chain.stream({"reviews": reviews, "question": question})):
+            print(chunk, end="", flush=True)
+            parts.append(chunk)
+        print()
+        result = "".join(parts)
+        answers.put(question, doc_ids, args.model, result, service.index_version)
     else:
-        data = df
-
-    # detect which years to show
-    show_2024 = "2024" in question
-    show_2025 = "2025" in question
-    if not show_2024 and not show_2025:
-        show_2024, show_2025 = True, True
-
-    fig, ax = plt.subplots(figsize=(8, 5))
-    x = range(len(data))
-    width = 0.35
-
-    if show_2024:
-        ax.bar(
-            [i - width/2 if show_2025 else i for i in x],
-            data["Half year ending June 2024 Revenue"],
-            width if show_2025 else 0.6,
-            label="Revenue H1 2024"
-        )
-
-    if show_2025:
-        ax.bar(
-            [i + width/2 if show_2024 else i for i in x],
-            data["Half year ending June 2025 Revenue"],
-            width if show_2024 else 0.6,
-            label="Revenue H1 2025"
-        )
-
-    ax.set_xticks(list(x))
-    ax.set_xticklabels(data["Company name"], rotation=45, ha="right")
-    ax.set_ylabel("Revenue (mn AUD)")
-    ax.set_title("Half-Year Revenue")
-    ax.legend()
-    plt.tight_layout()
-    plt.show()
+        trace.attrs["cached"] = True
+        print(result)
 
 
 while True:
@@ -73,19 +109,8 @@ while True:
         break
     
     
-     # Chart detection
-    if any(k in question.lower() for k in ["chart", "plot", "graph", "visualize"]):
-        print("Chart branch triggered!")
-        company = None
-        for name in df["Company name"].unique():
-            if name.lower() in question.lower():
-                company = name
-                break
-        plot_revenue(df, company)
-        continue
-
-
-
-    reviews = retriever.invoke(question)
-    result = chain.invoke({"reviews": reviews, "question": question})
-    print(result)
\ No newline at end of file
+    # Every stage is timed into one trace (see tracing.py); --timings prints the breakdown
+    with tracer.trace("cli", question=question, model=args.model) as trace:
+        answer(question, trace)
+    if args.timings:
+        print(format_breakdown(trace))
@@ -1,6 +1,7 @@
 # pages/company_info.py
 import streamlit as st
 import pandas as pd
+from dataset import load_dataset
 
 st.set_page_config(page_title="Company Info")
 
@@ -25,7 +26,7 @@ COMPANY_DESCRIPTIONS = {
 
 @st.cache_data
 def load_companies(path: str = "ragdata1.xlsx") -> pd.DataFrame:
-    df = pd.read_excel(path)
+    df = load_dataset(path)
     # keep only useful columns if present
     cols = [
         "Company name",
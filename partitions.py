@@ -0,0 +1,152 @@
+# partitions.py
+# Time-series layout: one document per company per period (ingest.build_period_documents),
+# split into one collection per period or per industry. Each partition keeps its own
+# manifest and BM25 index, so appending a period only builds the new partition, and a
+# question is fanned out concurrently to just the partitions it can be about.
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from filters import build_filter, filter_values
+from schema import PERIOD_FIELDS
+
+_PERIOD_KEY = re.compile(r"(fy|h1)(\d{4})")
+_HALF = re.compile(r"\bh1|half[- ]year|first half|interim")
+_FULL = re.compile(r"\bfy|full[- ]year|annual")
+_YEAR = re.compile(r"(?<!\d)(20\d{2})(?!\d)|\b(?:fy|h1) ?(\d{2})\b")
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="fanout")
+
+
+def partition_key(doc: Document, by: str) -> str:
+    if by == "period":
+        return doc.metadata["period"]
+    # Chroma collection names: 3-63 chars of [a-zA-Z0-9._-]
+    slug = re.sub(r"[^a-z0-9]+", "_", str(doc.metadata["industry"]).lower()).strip("_")
+    return slug[:40].rstrip("_") or "unknown"
+
+
+def partition_documents(documents: list[Document], by: str) -> dict[str, list[Document]]:
+    if by not in ("period", "industry"):
+        raise ValueError(f"partition_by must be 'period' or 'industry', got {by!r}")
+    partitions: dict[str, list[Document]] = {}
+    for doc in documents:
+        partitions.setdefault(partition_key(doc, by), []).append(doc)
+    return partitions
+
+
+def question_periods(question: str) -> list[str] | None:
+    """Period keys the question refers to ("FY25 revenue" -> ["fy2025"]); None if it names none."""
+    q = question.lower()
+    kinds = {kind for kind, pattern in (("h1", _HALF), ("fy", _FULL)) if pattern.search(q)}
+    years = set()
+    for full, short in _YEAR.findall(q):
+        years.add(int(full) if full else 2000 + int(short))
+    if not kinds and not years:
+        return None
+    found = []
+    for key in PERIOD_FIELDS:
+        kind, year = _PERIOD_KEY.fullmatch(key).groups()
+        if (not kinds or kind in kinds) and (not years or int(year) in years):
+            found.append(key)
+    return found or None
+
+
+class _Once:
+    """Thread-safe memo for the query embedding shared by all partitions of one search."""
+
+    def __init__(self, fn):
+        self._fn = fn
+        self._lock = threading.Lock()
+        self._value = None
+
+    def __call__(self):
+        with self._lock:
+            if self._value is None:
+                self._value = self._fn()
+            return self._value
+
+
+class PartitionedStore:
+    """The vector-store calls the app makes (`get`, `delete`), spread over partition stores."""
+
+    def __init__(self, stores: dict[str, Any]):
+        self.stores = stores
+
+    def get(self, ids: list[str] | None = None, where: dict | None = None, include=None, **kwargs: Any) -> dict:
+        merged = {"ids": [], "documents": [], "metadatas": []}
+        for store in self.stores.values():
+            found = store.get(ids=ids, where=where)
+            for field in merged:
+                merged[field] += found[field]
+        return merged
+
+    def delete(self, ids: list[str] | None = None, **kwargs: Any) -> None:
+        for store in self.stores.values():
+            store.delete(ids=ids)
+
+
+class PartitionedRetriever(BaseRetriever):
+    """Fans a query out to the relevant partitions' HybridRetrievers and ranks the pooled hits.
+
+    Every partition returns its scored dense and BM25 candidates; they are fused
+    once, over all partitions (see `HybridRetriever.rank`), so a weak top hit in one
+    partition doesn't outrank strong hits in another, and adaptive k applies to
+    the merged list.
+
+    Period partitions are chosen from the periods the question names (all of them
+    when it names none); industry partitions from the `industry` values of the
+    filter, with the question's periods pushed down as a `period` filter instead.
+    The query is embedded at most once and shared by every partition (pass a
+    memoized `query_embedding` callable to supply it).
+    """
+
+    partitions: dict[str, Any]
+    by: str = "period"
+    embeddings: Any = None
+    k: int = 5
+
+    def select(self, query: str, filter: dict | None = None) -> tuple[list[str], dict | None]:
+        """(partition keys to search, filter to push down into each of them)."""
+        periods = question_periods(query)
+        if self.by == "period":
+            keys = [p for p in periods or self.partitions if p in self.partitions]
+            return keys or list(self.partitions), filter
+
+        industries = filter_values(filter, "industry")
+        keys = list(self.partitions)
+        if industries:
+            wanted = {partition_key(Document(page_content="", metadata={"industry": i}), "industry")
+                      for i in industries}
+            keys = [key for key in keys if key in wanted]
+        if periods:
+            period_filter = build_filter(periods=periods)
+            filter = {"$and": [filter, period_filter]} if filter else period_filter
+        return keys, filter
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+                                k: int | None = None, adaptive: bool | None = None,
+                                filter: dict | None = None, query_embedding=None) -> list[Document]:
+        k = k or self.k
+        keys, where = self.select(query, filter)
+        if not keys:
+            return []
+        embed = query_embedding
+        if embed is None and self.embeddings is not None:
+            embed = _Once(lambda: self.embeddings.embed_query(query))
+        futures = [
+            _executor.submit(self.partitions[key].candidates, query, filter=where, query_embedding=embed)
+            for key in keys
+        ]
+        dense, lexical = [], []
+        for future in futures:
+            dense_hits, lexical_hits = future.result()
+            dense += dense_hits
+            lexical += lexical_hits
+        # Partitions share embeddings and settings, so any of them can rank the pooled hits
+        return self.partitions[keys[0]].rank(dense, lexical, k=k, adaptive=adaptive, query=query)
@@ -0,0 +1,154 @@
+# pipeline.py
+# Async execution layer shared by every Streamlit session in the process.
+#
+# Streamlit runs each session's script in its own thread, so this module owns one
+# asyncio loop in a background thread and exposes synchronous wrappers around it:
+#   - retrieval runs in worker threads, with identical in-flight searches coalesced;
+#   - generation goes through a global semaphore (queued FIFO) so Ollama is never
+#     given more than `max_concurrent` prompts at once;
+#   - identical in-flight generations (same question, documents and model) are
+#     single-flighted: one Ollama call, every waiting session streams its tokens.
+import asyncio
+import contextvars
+import threading
+
+import httpx
+
+from answer_cache import normalize_question
+
+
+def pooled_client_kwargs(max_connections: int = 4) -> dict:
+    """`client_kwargs` for OllamaLLM: one keep-alive connection pool per model instance."""
+    return {"limits": httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)}
+
+
+class _Flight:
+    """One in-flight generation; late joiners replay the tokens so far, then follow live."""
+
+    def __init__(self):
+        self.tokens: list[str] = []
+        self.done = False
+        self.error: Exception | None = None
+        self.changed = asyncio.Condition()
+
+    async def push(self, token: str) -> None:
+        async with self.changed:
+            self.tokens.append(token)
+            self.changed.notify_all()
+
+    async def finish(self, error: Exception | None = None) -> None:
+        async with self.changed:
+            self.done = True
+            self.error = error
+            self.changed.notify_all()
+
+    async def follow(self):
+        seen = 0
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: seen < len(self.tokens) or self.done)
+                new, done, error = self.tokens[seen:], self.done, self.error
+            for token in new:
+                yield token
+            seen += len(new)
+            if done:
+                if error is not None:
+                    raise error
+                return
+
+
+class Pipeline:
+    """Bounded, coalescing retrieval + generation for all sessions of the process."""
+
+    def __init__(self, max_concurrent: int = 2):
+        self.max_concurrent = max_concurrent
+        self.waiting = 0
+        self.running = 0
+        self.coalesced = 0
+        self._calls: dict[tuple, asyncio.Future] = {}
+        self._flights: dict[tuple, _Flight] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+        self._loop = asyncio.new_event_loop()
+        self._slots = asyncio.Semaphore(max_concurrent)
+        threading.Thread(target=self._loop.run_forever, name="pipeline-loop", daemon=True).start()
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    # ---------------- Retrieval ----------------
+    async def _coalesced(self, key: tuple, fn):
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(asyncio.to_thread(fn))
+            self._calls[key] = future
+            future.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(future)
+
+    def retrieve(self, service, question: str, **kwargs) -> list:
+        """`service.retrieve(question, **kwargs)`, shared with identical concurrent calls."""
+        frozen = tuple(sorted((name, tuple(v) if isinstance(v, list) else v) for name, v in kwargs.items()))
+        key = ("retrieve", normalize_question(question), frozen)
+        # Run in the caller's context, so tracing spans land on the caller's trace
+        context = contextvars.copy_context()
+        return self._run(self._coalesced(key, lambda: context.run(service.retrieve, question, **kwargs)))
+
+    # ---------------- Generation ----------------
+    async def _generate(self, key: tuple, flight: _Flight, chain, inputs: dict) -> None:
+        error = None
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            async for chunk in chain.astream(inputs):
+                await flight.push(chunk)
+        except Exception as e:
+            error = e
+        finally:
+            self.running -= 1
+            self._slots.release()
+            self._flights.pop(key, None)
+            await flight.finish(error)
+
+    async def _follow(self, key: tuple, chain, make_inputs):
+        flight = self._flights.get(key)
+        if flight is None:
+            inputs = make_inputs()
+            flight = self._flights[key] = _Flight()
+            # A task of its own, so a session that stops reading doesn't cancel the others
+            task = asyncio.get_running_loop().create_task(self._generate(key, flight, chain, inputs))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            self.coalesced += 1
+        async for token in flight.follow():
+            yield token
+
+    def stream_answer(self, key: tuple, chain, make_inputs):
+        """Yield `chain`'s answer tokens; `key` identifies identical requests (e.g. AnswerCache.key).
+
+        `make_inputs()` builds the chain inputs and is only called by the request
+        that actually starts the generation.
+        """
+        tokens = self._follow(key, chain, make_inputs)
+        try:
+            while True:
+                try:
+                    yield self._run(tokens.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            asyncio.run_coroutine_threadsafe(tokens.aclose(), self._loop)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "waiting": self.waiting,
+            "in_flight": len(self._flights),
+            "coalesced": self.coalesced,
+        }
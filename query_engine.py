@@ -0,0 +1,215 @@
+# query_engine.py
+# Answers rank / filter / aggregate questions ("top 5 companies by FY25 revenue",
+# "companies with P/E under 10", "average profit change in Materials") directly from
+# the DataFrame with vectorized pandas ops, instead of asking the LLM to do arithmetic
+# over a handful of retrieved documents.
+import re
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from entity_linker import CompanyLinker, IndustryLinker, clean_industry
+from schema import (
+    BVPS, CODE, EPS_H1_24, EPS_H1_25, EQUITY, INDUSTRY, MARKET_PRICE, NAME, PB, PE_H1_25,
+    PROFIT_CHANGE_FY, PROFIT_CHANGE_H1, PROFIT_FY24, PROFIT_FY25, PROFIT_H1_24, PROFIT_H1_25,
+    REVENUE_CHANGE_FY, REVENUE_CHANGE_H1, REVENUE_FY24, REVENUE_FY25, REVENUE_H1_24, REVENUE_H1_25,
+)
+
+
+@dataclass(frozen=True)
+class Metric:
+    key: str
+    label: str
+    pattern: str
+    unit: str = ""
+    # {"fy"/"h1": {year: column}}; metrics without periods use the "" entry
+    columns: dict | None = None
+    # {"fy"/"h1": column} holding the year-on-year percentage change, if any
+    change: dict | None = None
+
+
+# Order matters: more specific patterns (EPS, P/E) are tried before "profit"/"earnings"
+METRICS = [
+    Metric("eps", "EPS", r"\beps\b|earnings per share", "AUD",
+           columns={"h1": {2025: EPS_H1_25, 2024: EPS_H1_24}}),
+    Metric("pe", "P/E", r"\bp/?e\b|price[- ]to[- ]earnings|\bpe ratio", "x",
+           columns={"h1": {2025: PE_H1_25}}),
+    Metric("pb", "P/B", r"\bp/?b\b|price[- ]to[- ]book", "x", columns={"": {None: PB}}),
+    Metric("bvps", "Book value per share", r"\bbvps\b|book value per share", "AUD", columns={"": {None: BVPS}}),
+    Metric("price", "Market price", r"\b(market|share|stock) price", "AUD", columns={"": {None: MARKET_PRICE}}),
+    Metric("equity", "Shareholder equity", r"\bequity\b(?! real estate)", "mn AUD", columns={"": {None: EQUITY}}),
+    Metric("revenue", "Revenue", r"\brevenues?\b|\bsales\b|\bturnover\b", "mn AUD",
+           columns={"fy": {2025: REVENUE_FY25, 2024: REVENUE_FY24}, "h1": {2025: REVENUE_H1_25, 2024: REVENUE_H1_24}},
+           change={"fy": REVENUE_CHANGE_FY, "h1": REVENUE_CHANGE_H1}),
+    Metric("profit", "Profit after tax", r"\bprofit(s|able|ability)?\b|\bearnings\b|\bnet income\b", "mn AUD",
+           columns={"fy": {2025: PROFIT_FY25, 2024: PROFIT_FY24}, "h1": {2025: PROFIT_H1_25, 2024: PROFIT_H1_24}},
+           change={"fy": PROFIT_CHANGE_FY, "h1": PROFIT_CHANGE_H1}),
+]
+
+_NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+                 "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10}
+_RANK_DESC = r"\b(top|highest|largest|biggest|most|best|greatest)\b"
+_RANK_ASC = r"\b(bottom|lowest|smallest|least|worst|weakest)\b"
+# Bare "mean" is usually the verb ("what does a high P/E mean"), so it needs an article
+_AGGREGATE = {"average": "mean", "(?:the|a) mean": "mean", "median": "median", "total": "sum", "sum": "sum"}
+_CHANGE = r"\b(growth|grow|grows|grew|growing|change|changes|increase|decrease|decline)\b"
+# Industry / sector wording; if none of it resolves to an Industry Group the question is left to RAG
+_INDUSTRY_WORDS = (r"\b(industry|industries|sector|sectors|segment|insurers?|banks?|banking|miners?|mining|"
+                   r"retailers?|supermarkets?|grocers?|telcos?|telecoms?|energy|tech|technology|utilit(y|ies)|reits?)\b")
+_COMPARISON = re.compile(
+    r"\b(under|below|less than|lower than|over|above|more than|greater than|higher than|at least|at most)"
+    r"\s*\$?(-?\d+(?:\.\d+)?)\s*(%|x)?"
+)
+_LOWER = {"under", "below", "less than", "lower than", "at most"}
+_YEAR = re.compile(r"20[1-3]\d")  # reporting years, not thresholds like "over 2000"
+
+
+@dataclass
+class StructuredResult:
+    intent: str            # "rank" | "filter" | "aggregate"
+    description: str       # e.g. "Top 5 companies by Revenue (FY 2025)"
+    table: pd.DataFrame    # rows shown to the user
+    value: str | None = None  # formatted aggregate, when intent == "aggregate"
+
+    def to_markdown(self) -> str:
+        lines = [f"**{self.description}**", ""]
+        if self.value is not None:
+            lines += [f"**{self.value}**", ""]
+        if not self.table.empty:
+            header = list(self.table.columns)
+            lines.append("| " + " | ".join(header) + " |")
+            lines.append("|" + "---|" * len(header))
+            for row in self.table.itertuples(index=False):
+                lines.append("| " + " | ".join(str(v) for v in row) + " |")
+        else:
+            lines.append("No companies match.")
+        lines += ["", "_Computed directly from the company dataset._"]
+        return "\n".join(lines)
+
+
+class QueryEngine:
+    """Routes numeric / ranking questions to pandas; returns None for everything else."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df.assign(**{INDUSTRY: df[INDUSTRY].map(clean_industry)})
+        self.industries = IndustryLinker(df)
+        self.companies = CompanyLinker(df)
+
+    # ---------------- Parsing ----------------
+    @staticmethod
+    def _metric(q: str) -> Metric | None:
+        for metric in METRICS:
+            if re.search(metric.pattern, q):
+                return metric
+        return None
+
+    @staticmethod
+    def _column(metric: Metric, q: str) -> tuple[str, str, bool] | None:
+        """Pick (column, period label, is_percentage_change) for the question; None if it compares years."""
+        half = bool(re.search(r"\bh1\b|half[- ]year|first half", q))
+        period = "h1" if half and "h1" in metric.columns else ("fy" if "fy" in metric.columns else next(iter(metric.columns)))
+
+        if metric.change and re.search(_CHANGE, q):
+            return metric.change[period], f"{period.upper()} change", True
+
+        years = metric.columns[period]
+        mentioned = [y for y in years if y and re.search(rf"\b{y}\b|\bfy ?{str(y)[2:]}\b|\bh1 ?{str(y)[2:]}\b", q)]
+        if len(mentioned) > 1:
+            # "2024 vs 2025 revenue" compares periods, which a single column can't answer
+            return None
+        year = mentioned[0] if mentioned else max(years, key=lambda y: y or 0)
+        label = " ".join(p for p in (period.upper() if period else "", str(year) if year else "") if p)
+        return years[year], label, False
+
+    @staticmethod
+    def _count(q: str, default: int) -> int:
+        m = re.search(r"\b(?:top|bottom|first|last)\s+(\d+|" + "|".join(_NUMBER_WORDS) + r")\b", q) \
+            or re.search(r"\b(\d+|" + "|".join(_NUMBER_WORDS) + r")\s+(?:companies|firms|stocks)\b", q)
+        if not m:
+            return default
+        n = m.group(1)
+        return int(n) if n.isdigit() else _NUMBER_WORDS[n]
+
+    # ---------------- Execution ----------------
+    def _table(self, data: pd.DataFrame, column: str, label: str, pct: bool) -> pd.DataFrame:
+        values = data[column]
+        shown = values.map(lambda v: f"{v:.1%}" if pct else f"{v:,.2f}")
+        return pd.DataFrame({
+            "Company": data[NAME].astype(str).str.strip().values,
+            "Code": data[CODE].values,
+            "Industry": data[INDUSTRY].values,
+            label: shown.values,
+        })
+
+    def answer(self, question: str) -> StructuredResult | None:
+        q = question.lower()
+        metric = self._metric(q)
+        if metric is None:
+            return None
+
+        picked = self._column(metric, q)
+        if picked is None:
+            return None
+        column, period, pct = picked
+        label = f"{metric.label} ({period})" if period else metric.label
+        if metric.unit and not pct:
+            label = f"{label} [{metric.unit}]"
+
+        data = self.df[self.df[column].notna()]
+        industries = self.industries.link(question)
+        scope = ""
+        if industries:
+            data = data[data[INDUSTRY].isin(industries)]
+            scope = " in " + ", ".join(industries)
+        elif re.search(_INDUSTRY_WORDS, q):
+            # "Which insurer ..." names a group we can't resolve; answering market-wide would be wrong
+            return None
+        codes = self.companies.link(question)
+        if codes:
+            data = data[data[CODE].isin(codes)]
+            scope += " among " + ", ".join(self.companies.names[c] for c in codes)
+
+        # "over 2024 to 2025" names a period, not a threshold
+        comparison = next((m for m in _COMPARISON.finditer(q)
+                           if m.group(3) or not _YEAR.fullmatch(m.group(2))), None)
+        aggregate = next((fn for word, fn in _AGGREGATE.items() if re.search(rf"\b{word}\b", q)), None)
+        descending = re.search(_RANK_DESC, q)
+        ascending = re.search(_RANK_ASC, q)
+
+        if comparison:
+            op, raw, unit = comparison.groups()
+            if unit == "%" and not pct:
+                # "grew more than 5%" on a level column (revenue, EPS, ...) has no meaning here
+                return None
+            threshold = float(raw) / 100 if (unit == "%" or pct and abs(float(raw)) > 1) else float(raw)
+            if op in _LOWER:
+                mask = data[column] <= threshold if op == "at most" else data[column] < threshold
+            else:
+                mask = data[column] >= threshold if op == "at least" else data[column] > threshold
+            data = data[mask].sort_values(column, ascending=op in _LOWER)
+            desc = f"Companies{scope} with {label} {op} {raw}{unit or ''}"
+            return StructuredResult("filter", desc, self._table(data, column, label, pct))
+
+        if aggregate:
+            values = data[column].to_numpy(dtype=float)
+            result = getattr(np, aggregate)(values) if len(values) else float("nan")
+            shown = f"{result:.1%}" if pct else f"{result:,.2f}"
+            word = {"mean": "Average", "median": "Median", "sum": "Total"}[aggregate]
+            desc = f"{word} {label}{scope} across {len(values)} compan{'y' if len(values) == 1 else 'ies'}"
+            return StructuredResult("aggregate", desc, self._table(data.sort_values(column, ascending=False), column, label, pct), shown)
+
+        if descending or ascending:
+            if len(codes) == 1:
+                # "Did BHP have the highest revenue?" compares BHP with the market, not with itself
+                return None
+            # "Which company had the highest ..." -> 1; "top companies by ..." -> 5
+            singular = re.search(r"\b(which|what) (company|firm|stock)\b", q) and not re.search(r"\bcompanies\b", q)
+            n = self._count(q, default=1 if singular else 5)
+            data = data.nsmallest(n, column) if ascending and not descending else data.nlargest(n, column)
+            word = "Bottom" if ascending and not descending else "Top"
+            noun = "company" if len(data) == 1 else f"{len(data)} companies"
+            desc = f"{word} {noun}{scope} by {label}"
+            return StructuredResult("rank", desc, self._table(data, column, label, pct))
+
+        return None
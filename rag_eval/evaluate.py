@@ -4,7 +4,7 @@ import re
 import pandas as pd
 from tqdm import tqdm
 
-from utils import ensure_dirs, clean, score_known_infer, score_outkb
+from utils import ensure_dirs, clean, score_known_infer, score_outkb, sbert_cosine_batch
 
 COHORT_KNOWN   = "Known"
 COHORT_INFER   = "Inferred"     # normalize spelling
@@ -49,7 +49,7 @@ def process_known_or_infered(df: pd.DataFrame, cohort_label: str) -> pd.DataFram
         expco = clean(r.get(COLS_BASE["expected_company"], ""))
         for k in (1, 3, 5):
             pred = r.get(COLS_COMMON_K[k], "")
-            met = score_known_infer(gold, pred)
+            met = score_known_infer(gold, pred, semantic=False)
             met.update({
                 "cohort": cohort_label,
                 "row_id": i,
@@ -60,7 +60,11 @@ def process_known_or_infered(df: pd.DataFrame, cohort_label: str) -> pd.DataFram
                 "pred": clean(pred),
             })
             rows.append(met)
-    return pd.DataFrame(rows)
+    out = pd.DataFrame(rows)
+    if not out.empty:
+        # All SBERT cosines of the cohort in one batched, cached pass
+        out["semantic_cosine"] = sbert_cosine_batch(out["pred"].tolist(), out["gold"].tolist())
+    return out
 
 def process_outkb(df: pd.DataFrame) -> pd.DataFrame:
     rows = []
@@ -0,0 +1,194 @@
+"""Parallel, resumable evaluation runner.
+
+Same inputs and CSV outputs as evaluate.py, but every scored row is written to an
+append-only SQLite store keyed by hash(query, gold, pred, metric version), so a
+re-run only scores rows whose text changed (or all rows after a METRIC_VERSION
+bump), and a crash loses at most the chunk in progress. ROUGE and refusal scoring
+run in a process pool; SBERT cosines are computed in batches in the main process.
+
+    python runner.py --input data/RAGfaq.xlsx --outdir output_results --workers 4
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+from tqdm import tqdm
+
+from evaluate import (
+    ALIASES_INFER, ALIASES_KNOWN, ALIASES_OUTKB, COHORT_INFER, COHORT_KNOWN, COHORT_OUTKB,
+    COLS_BASE, COLS_COMMON_K, _build_sheet_map, _find_sheet,
+)
+from utils import clean, ensure_dirs, rougeL_f1, sbert_cosine_batch, score_outkb
+
+# Bump when a metric's definition changes; old scores are then ignored, not reused
+METRIC_VERSION = "1"
+METRICS = ["rougeL", "semantic_cosine", "good_refusal", "hallucination_rate"]
+
+
+def row_key(query: str, gold: str, pred: str, kind: str) -> str:
+    payload = json.dumps([query, gold, pred, f"{kind}:{METRIC_VERSION}"])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ---------------- Store ----------------
+def open_store(path: str) -> sqlite3.Connection:
+    ensure_dirs(os.path.dirname(os.path.abspath(path)))
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS scores (
+            key TEXT PRIMARY KEY, metric_version TEXT, scored_at REAL,
+            rougeL REAL, semantic_cosine REAL, good_refusal REAL, hallucination_rate REAL
+        );
+        CREATE TABLE IF NOT EXISTS items (
+            run TEXT, cohort TEXT, row_id INTEGER, k INTEGER, key TEXT,
+            query TEXT, expected_company TEXT, gold TEXT, pred TEXT,
+            PRIMARY KEY (run, cohort, row_id, k)
+        );
+    """)
+    return conn
+
+
+def scored_keys(conn: sqlite3.Connection) -> set[str]:
+    return {key for (key,) in conn.execute("SELECT key FROM scores")}
+
+
+def append_scores(conn: sqlite3.Connection, rows: list[tuple[str, dict]]) -> None:
+    now = time.time()
+    conn.executemany(
+        "INSERT OR IGNORE INTO scores VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(key, METRIC_VERSION, now, *[None if pd.isna(m[c]) else float(m[c]) for c in METRICS]) for key, m in rows],
+    )
+    conn.commit()
+
+
+# ---------------- Items ----------------
+def collect_items(input_path: str) -> pd.DataFrame:
+    """One row per (cohort, row, k) with its text and store key."""
+    xls = pd.ExcelFile(input_path)
+    smap = _build_sheet_map(xls)
+    cohorts = [
+        (COHORT_KNOWN, _find_sheet(smap, ALIASES_KNOWN), "qa"),
+        (COHORT_INFER, _find_sheet(smap, ALIASES_INFER), "qa"),
+        (COHORT_OUTKB, _find_sheet(smap, ALIASES_OUTKB), "outkb"),
+    ]
+    rows = []
+    for cohort, sheet, kind in cohorts:
+        if not sheet:
+            continue
+        df = pd.read_excel(input_path, sheet_name=sheet)
+        for i, r in zip(df.index, df.to_dict("records")):
+            query = clean(r.get(COLS_BASE["query"], ""))
+            expco = clean(r.get(COLS_BASE["expected_company"], ""))
+            gold = clean(r.get(COLS_BASE["gold"], ""))
+            if kind == "outkb":
+                # evaluate.py does not report query / gold for this cohort
+                query, expco, gold = "", "", ""
+            for k in (1, 3, 5):
+                pred = clean(r.get(COLS_COMMON_K[k], ""))
+                rows.append({"cohort": cohort, "row_id": int(i), "k": k, "kind": kind, "query": query,
+                             "expected_company": expco, "gold": gold, "pred": pred,
+                             "key": row_key(query, gold, pred, kind)})
+    if not rows:
+        raise RuntimeError("No recognized sheets found. Available: " + ", ".join(xls.sheet_names))
+    return pd.DataFrame(rows)
+
+
+def _score_chunk(chunk: list[tuple[str, str, str, str]]) -> list[tuple[str, dict]]:
+    # Runs in a worker process: ROUGE / refusal only (SBERT stays in the parent)
+    out = []
+    for key, kind, gold, pred in chunk:
+        if kind == "outkb":
+            out.append((key, score_outkb(pred)))
+        else:
+            out.append((key, {"rougeL": rougeL_f1(pred, gold), "semantic_cosine": float("nan"),
+                              "good_refusal": float("nan"), "hallucination_rate": float("nan")}))
+    return out
+
+
+def score_missing(conn: sqlite3.Connection, items: pd.DataFrame, workers: int = 4, chunk_size: int = 64) -> int:
+    """Score the items whose key is not in the store yet; returns how many were scored."""
+    todo = items[~items["key"].isin(scored_keys(conn))].drop_duplicates("key")
+    if todo.empty:
+        return 0
+
+    # Batched + cached SBERT for the whole backlog before the pool starts
+    qa = todo[todo["kind"] == "qa"]
+    semantic = dict(zip(qa["key"], sbert_cosine_batch(qa["pred"].tolist(), qa["gold"].tolist()))) if len(qa) else {}
+
+    records = list(zip(todo["key"], todo["kind"], todo["gold"], todo["pred"]))
+    chunks = [records[i:i + chunk_size] for i in range(0, len(records), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_score_chunk, chunk) for chunk in chunks]
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Scoring"):
+            rows = future.result()
+            for key, met in rows:
+                if key in semantic:
+                    met["semantic_cosine"] = semantic[key]
+            append_scores(conn, rows)  # streamed: a crash keeps every finished chunk
+    return len(todo)
+
+
+def register_run(conn: sqlite3.Connection, run: str, items: pd.DataFrame) -> None:
+    cols = ["cohort", "row_id", "k", "key", "query", "expected_company", "gold", "pred"]
+    conn.executemany(
+        "INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [(run, *row) for row in items[cols].itertuples(index=False)],
+    )
+    conn.commit()
+
+
+# ---------------- Reports from the store ----------------
+def per_row(conn: sqlite3.Connection, run: str) -> pd.DataFrame:
+    return pd.read_sql_query(f"""
+        SELECT {", ".join("s." + m for m in METRICS)}, i.cohort, i.row_id, i.k,
+               i.query, i.expected_company, i.gold, i.pred
+        FROM items i JOIN scores s USING (key)
+        WHERE i.run = ?
+        ORDER BY i.rowid
+    """, conn, params=(run,))
+
+
+def aggregate(conn: sqlite3.Connection, run: str) -> pd.DataFrame:
+    """evaluate.aggregate, computed in SQL (AVG skips NULLs like pandas' mean skips NaN)."""
+    return pd.read_sql_query(f"""
+        SELECT i.cohort, i.k, {", ".join(f"AVG(s.{m}) AS {m}" for m in METRICS)}
+        FROM items i JOIN scores s USING (key)
+        WHERE i.run = ?
+        GROUP BY i.cohort, i.k
+        ORDER BY i.cohort, i.k
+    """, conn, params=(run,))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--input", "-i", default="data/RAGfaq.xlsx")
+    ap.add_argument("--outdir", "-o", default="output_results")
+    ap.add_argument("--store", default=None, help="SQLite result store (default: <outdir>/scores.sqlite)")
+    ap.add_argument("--workers", "-w", type=int, default=os.cpu_count() or 2)
+    args = ap.parse_args()
+
+    ensure_dirs(args.outdir)
+    conn = open_store(args.store or os.path.join(args.outdir, "scores.sqlite"))
+
+    items = collect_items(args.input)
+    # A run is one version of the input file; editing an answer makes a new run whose
+    # unchanged rows are already in the store
+    run = hashlib.sha256(pd.util.hash_pandas_object(items["key"], index=False).values.tobytes()).hexdigest()[:16]
+    scored = score_missing(conn, items, workers=args.workers)
+    register_run(conn, run, items)
+    print(f"[OK] Scored {scored} new rows, reused {items['key'].nunique() - scored}")
+
+    per_row(conn, run).to_csv(os.path.join(args.outdir, "metrics_per_query.csv"), index=False)
+    aggregate(conn, run).to_csv(os.path.join(args.outdir, "metrics_by_cohort.csv"), index=False)
+    print("[OK] Wrote:")
+    print(" -", os.path.join(args.outdir, "metrics_per_query.csv"))
+    print(" -", os.path.join(args.outdir, "metrics_by_cohort.csv"))
+
+
+if __name__ == "__main__":
+    main()
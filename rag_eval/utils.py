@@ -1,11 +1,12 @@
+import hashlib
 import os
 import re
-from typing import Dict, Optional
+import sqlite3
+from typing import Dict, List, Optional, Sequence
 
 import numpy as np
 import matplotlib.pyplot as plt
 from rouge_score import rouge_scorer
-from sentence_transformers import SentenceTransformer, util
 
 def ensure_dirs(*paths: str) -> None:
     for p in paths:
@@ -32,12 +33,16 @@ def looks_like_refusal(s: str) -> bool:
     return any(re.search(p, s_low) for p in _ABSTAIN_PATTERNS)
 
 _rouge = rouge_scorer.RougeScorer(["rougeLsum"], use_stemmer=True)
-_sbert: Optional[SentenceTransformer] = None
+_sbert = None  # SentenceTransformer, imported on first use (keeps worker processes light)
+
+SBERT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+SBERT_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "sbert.sqlite")
 
 def _lazy_sbert():
     global _sbert
     if _sbert is None:
-        _sbert = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+        from sentence_transformers import SentenceTransformer
+        _sbert = SentenceTransformer(SBERT_MODEL)
     return _sbert
 
 def rougeL_f1(pred: str, ref: str) -> float:
@@ -46,18 +51,80 @@ def rougeL_f1(pred: str, ref: str) -> float:
         return 0.0
     return _rouge.score(ref, pred)["rougeLsum"].fmeasure
 
+# ---------------- SBERT (batched + cached on disk) ----------------
+def _text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def encode_texts(texts: Sequence[str], cache_path: Optional[str] = SBERT_CACHE,
+                 batch_size: int = 64) -> np.ndarray:
+    """Normalised SBERT embeddings for `texts` (one row each).
+
+    Each distinct text is encoded once; vectors are kept in a SQLite cache keyed by
+    model + text hash, so the same gold answers / predictions are never re-encoded
+    across runs. Pass cache_path=None to skip the cache.
+    """
+    keys = [_text_key(t) for t in texts]
+    unique = dict(zip(keys, texts))
+    vectors: Dict[str, np.ndarray] = {}
+
+    conn = None
+    if cache_path:
+        ensure_dirs(os.path.dirname(cache_path))
+        conn = sqlite3.connect(cache_path)
+        conn.execute("CREATE TABLE IF NOT EXISTS sbert (model TEXT, key TEXT, vector BLOB, PRIMARY KEY (model, key))")
+        wanted = list(unique)
+        for start in range(0, len(wanted), 500):
+            chunk = wanted[start:start + 500]
+            rows = conn.execute(
+                f"SELECT key, vector FROM sbert WHERE model = ? AND key IN ({','.join('?' * len(chunk))})",
+                [SBERT_MODEL, *chunk],
+            )
+            vectors.update((key, np.frombuffer(blob, dtype=np.float32)) for key, blob in rows)
+
+    missing = [key for key in unique if key not in vectors]
+    if missing:
+        encoded = _lazy_sbert().encode([unique[k] for k in missing], batch_size=batch_size,
+                                       convert_to_numpy=True, normalize_embeddings=True)
+        encoded = np.asarray(encoded, dtype=np.float32)
+        vectors.update(zip(missing, encoded))
+        if conn is not None:
+            conn.executemany("INSERT OR REPLACE INTO sbert VALUES (?, ?, ?)",
+                             [(SBERT_MODEL, key, vec.tobytes()) for key, vec in zip(missing, encoded)])
+            conn.commit()
+    if conn is not None:
+        conn.close()
+
+    if not keys:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.stack([vectors[k] for k in keys])
+
+def sbert_cosine_batch(preds: Sequence[str], refs: Sequence[str],
+                       cache_path: Optional[str] = SBERT_CACHE) -> np.ndarray:
+    """Cosine similarity of each (pred, ref) pair; 0.0 where either side is empty."""
+    preds = [clean(p) for p in preds]
+    refs = [clean(r) for r in refs]
+    scores = np.zeros(len(preds), dtype=np.float64)
+    pairs = [i for i, (p, r) in enumerate(zip(preds, refs)) if p and r]
+    if not pairs:
+        return scores
+
+    # Embed every distinct text once, then one row-wise dot product for all pairs
+    texts: List[str] = list(dict.fromkeys([preds[i] for i in pairs] + [refs[i] for i in pairs]))
+    index = {t: n for n, t in enumerate(texts)}
+    emb = encode_texts(texts, cache_path)
+    p = emb[[index[preds[i]] for i in pairs]]
+    r = emb[[index[refs[i]] for i in pairs]]
+    scores[pairs] = np.einsum("ij,ij->i", p, r)
+    return scores
+
 def sbert_cosine(pred: str, ref: str) -> float:
-    pred, ref = clean(pred), clean(ref)
-    if not pred or not ref:
-        return 0.0
-    model = _lazy_sbert()
-    emb = model.encode([pred, ref], convert_to_tensor=True, normalize_embeddings=True)
-    return float(util.cos_sim(emb[0], emb[1]).item())
+    return float(sbert_cosine_batch([pred], [ref])[0])
 
-def score_known_infer(gold: str, pred: str) -> Dict[str, float]:
+def score_known_infer(gold: str, pred: str, semantic: bool = True) -> Dict[str, float]:
+    # semantic=False leaves semantic_cosine for a later sbert_cosine_batch over all rows
     return {
         "rougeL": rougeL_f1(pred, gold),
-        "semantic_cosine": sbert_cosine(pred, gold),
+        "semantic_cosine": sbert_cosine(pred, gold) if semantic else np.nan,
         "good_refusal": np.nan,
         "hallucination_rate": np.nan,
     }
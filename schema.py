@@ -0,0 +1,76 @@
+# schema.py
+# Column names of ragdata1.xlsx and how they are labelled in the rendered documents.
+
+NAME = "Company name"
+CODE = "Company Code"
+INDUSTRY = "Industry Group"
+DESCRIPTION = "Company Description"
+ADDITIONAL_INFO = "Additional Information"
+WEBSITE = "Company Website"
+ASX_PAGE = "Company page in ASX"
+
+REVENUE_H1_25 = "Half year ending June 2025 Revenue"
+REVENUE_H1_24 = "Half year ending June 2024 Revenue"
+REVENUE_CHANGE_H1 = "Revenue Half year Percentage Change"
+PROFIT_H1_25 = "Half year ending June 2025 Profit after tax attributable to shareholders (net earnings) in Mn"
+PROFIT_H1_24 = "Half year ending June 2024 Profit after tax attributable to shareholders (net earnings) in Mn"
+PROFIT_CHANGE_H1 = "Profit after tax attributable to shareholders (net earnings) Percentage Change"
+REVENUE_FY25 = "Revenue for full year ending Jun 25 in mn in AUD"
+REVENUE_FY24 = "Revenue for full year ending Jun 24 in mn in AUD"
+REVENUE_CHANGE_FY = "Revenue for full year percentage change"
+PROFIT_FY25 = "Full year ending June 2025 Profit after tax attributable to shareholders (net earnings) in Mn"
+PROFIT_FY24 = "Full year ending June 2024 Profit after tax attributable to shareholders (net earnings) in Mn"
+PROFIT_CHANGE_FY = "Full year ending June 2024 Profit after tax attributable to shareholders percentage change"
+EQUITY = "Equity for shareholder in Mn AUD"
+SHARES = "Number of Shares in Millions"
+MARKET_PRICE = "Market Price in AUD on 15th Sep  2025"
+EPS_H1_25 = "Earnings per Share (AUD) for half year ending June 2025 (Net Profit attributable to share holder) divided by Number of shares"
+EPS_H1_24 = "Earnings per Share (AUD) for half year ending June 2024 (Net Profit attributable to share holder) divided by Number of shares. EPS measures how much profit a company generates for each outstanding share of its stock. Interpretation: A higher EPS generally means the company is more profitable on a per-share basis, which is positive for shareholders. "
+PE_H1_25 = "Price to Earnings ratio (x) for half year ending June 2025 : Market price divided by Earnings per share. The PE ratio shows how much investors are willing to pay for each dollar of the companys earnings. It compares the companys share price with its earnings per share. Interpretation: A high P/E ratio suggests the market expects strong future growth (but it could also mean the stock is overpriced). A low PE ratio may indicate undervaluation or slower growth expectations. "
+BVPS = "Book value per share (AUD): Equity for shareholder/Number of shares. Book Value per Share (BVPS) is a financial ratio that represents the net asset value of a company available to each outstanding share of common stock. BVPS shows the accounting value of each share if the company were liquidated today, based on its historical cost of assets and liabilities. Comparison with Market Price: Market Price per Share > BVPS: Investors believe the company has strong future earnings power, intangible assets (brand, patents, goodwill), or growth potential not fully reflected on the balance sheet. Market Price per Share < BVPS: Could indicate the stock is undervalued, or it may signal concerns about profitability, asset quality, or growth. Indicator of Financial Strength: A higher BVPS over time suggests the company is consistently building value for shareholders (through retained earnings, reinvestments). A declining BVPS could mean losses, high dividend payouts, or write-downs of assets."
+PB = "Price to Book value (x): Market price/Book value per share: It shows how much investors are willing to pay for each $1 of book value (net assets) of the company."
+
+# (label, column) pairs rendered after the "Company: <name> (Code: <code>)" line
+DOCUMENT_FIELDS = [
+    ("Industry", INDUSTRY),
+    ("Description", DESCRIPTION),
+    ("Information", ADDITIONAL_INFO),
+    ("Website", WEBSITE),
+    ("ASX", ASX_PAGE),
+    ("Revenue (H1 2025) in AUD", REVENUE_H1_25),
+    ("Revenue (H1 2024) in AUD", REVENUE_H1_24),
+    ("Revenue Change", REVENUE_CHANGE_H1),
+    ("Profit After Tax (H1 2025) in AUD", PROFIT_H1_25),
+    ("Profit After Tax (H1 2024) in AUD", PROFIT_H1_24),
+    ("Profit Change H1", PROFIT_CHANGE_H1),
+    ("Revenue (Full Year 2025)", REVENUE_FY25),
+    ("Revenue (Full Year 2024)", REVENUE_FY24),
+    ("Revenue Change Full Year", REVENUE_CHANGE_FY),
+    ("Profit After Tax (Full Year 2025) in AUD", PROFIT_FY25),
+    ("Profit After Tax (Full Year 2024) in AUD", PROFIT_FY24),
+    ("Profit Change Full Year", PROFIT_CHANGE_FY),
+    ("Equity", EQUITY),
+    ("Shares", SHARES),
+    ("Market price", MARKET_PRICE),
+    ("EPS (H1 2025)", EPS_H1_25),
+    ("EPS (H1 2024)", EPS_H1_24),
+    ("Price-to-Earnings (P/E, H1 2025)", PE_H1_25),
+    ("Book Value per Share (BVPS)", BVPS),
+    ("Price-to-Book Ratio (P/B)", PB),
+]
+
+# Columns holding a year-on-year change stored as a fraction (0.32 == 32%)
+PERCENT_CHANGE_COLUMNS = {REVENUE_CHANGE_H1, PROFIT_CHANGE_H1, REVENUE_CHANGE_FY, PROFIT_CHANGE_FY}
+
+# Time-series layout (RetrievalService(partition_by=...)): one document per company per
+# reporting period, keyed "<fy|h1><year>". A new period is a new entry here, which
+# becomes a new partition without touching the existing ones.
+PERIOD_FIELDS = {
+    "fy2025": ("FY 2025", [REVENUE_FY25, REVENUE_CHANGE_FY, PROFIT_FY25, PROFIT_CHANGE_FY]),
+    "fy2024": ("FY 2024", [REVENUE_FY24, PROFIT_FY24]),
+    "h12025": ("H1 2025", [REVENUE_H1_25, REVENUE_CHANGE_H1, PROFIT_H1_25, PROFIT_CHANGE_H1, EPS_H1_25, PE_H1_25]),
+    "h12024": ("H1 2024", [REVENUE_H1_24, PROFIT_H1_24, EPS_H1_24]),
+}
+# Period-independent fields, kept in their own "profile" document per company
+PROFILE_FIELDS = [INDUSTRY, DESCRIPTION, ADDITIONAL_INFO, WEBSITE, ASX_PAGE, EQUITY, SHARES, MARKET_PRICE, BVPS, PB]
+PROFILE = "profile"
@@ -0,0 +1,188 @@
+# snapshots.py
+# Blue/green index snapshots. Each build goes into its own directory under the
+# snapshot root (workbook copy + vector store + manifest + BM25), is validated, and
+# only then becomes live by atomically rewriting the CURRENT.json pointer. Running
+# RetrievalService instances notice the new pointer and swap to it in the
+# background; the previous snapshot is kept for rollback.
+#
+#   python snapshots.py build              # build from ragdata1.xlsx, validate, promote
+#   python snapshots.py list
+#   python snapshots.py rollback
+#   python snapshots.py prune --keep 3
+import argparse
+import json
+import os
+import shutil
+import time
+
+from dataset import DEFAULT_PATH, file_sha256
+
+SNAPSHOT_ROOT = "./indexes"
+POINTER_NAME = "CURRENT.json"
+DATA_NAME = "data.xlsx"        # copy of the workbook the snapshot was built from
+META_NAME = "snapshot.json"    # written last; its presence marks a complete, validated build
+
+
+# ---------------- Pointer ----------------
+def read_pointer(root: str = SNAPSHOT_ROOT) -> dict:
+    path = os.path.join(root, POINTER_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def current_snapshot(root: str = SNAPSHOT_ROOT) -> str | None:
+    """Directory of the live snapshot, or None when nothing has been promoted."""
+    name = read_pointer(root).get("current")
+    return os.path.join(root, name) if name else None
+
+
+def _write_pointer(root: str, pointer: dict) -> None:
+    # os.replace is atomic, so readers see either the old or the new pointer
+    tmp = os.path.join(root, POINTER_NAME + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(pointer, f, indent=2)
+    os.replace(tmp, os.path.join(root, POINTER_NAME))
+
+
+def list_snapshots(root: str = SNAPSHOT_ROOT) -> list[str]:
+    """Names of complete snapshots, oldest first."""
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        name for name in os.listdir(root)
+        if os.path.exists(os.path.join(root, name, META_NAME))
+    )
+
+
+def promote(name: str, root: str = SNAPSHOT_ROOT) -> None:
+    if name not in list_snapshots(root):
+        raise ValueError(f"{name!r} is not a complete snapshot under {root}")
+    pointer = read_pointer(root)
+    previous = pointer.get("current")
+    _write_pointer(root, {
+        "current": name,
+        "previous": previous if previous != name else pointer.get("previous"),
+        "promoted_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    })
+
+
+def rollback(root: str = SNAPSHOT_ROOT) -> str:
+    """Repoint CURRENT at the previous snapshot; returns its name."""
+    previous = read_pointer(root).get("previous")
+    if not previous or previous not in list_snapshots(root):
+        raise ValueError("No previous snapshot to roll back to")
+    promote(previous, root)
+    return previous
+
+
+def prune(root: str = SNAPSHOT_ROOT, keep: int = 3) -> list[str]:
+    """Delete old and unfinished snapshot directories, always keeping current and previous."""
+    pointer = read_pointer(root)
+    protected = {pointer.get("current"), pointer.get("previous")}
+    complete = list_snapshots(root)
+    protected.update(complete[-keep:])
+    removed = []
+    for name in sorted(os.listdir(root)) if os.path.isdir(root) else []:
+        path = os.path.join(root, name)
+        if name in protected or not os.path.isdir(path):
+            continue
+        shutil.rmtree(path)
+        removed.append(name)
+    return removed
+
+
+# ---------------- Build + validate ----------------
+def sample_queries(df, n: int = 5) -> list[tuple[str, str]]:
+    """(company name, expected company code) pairs spread across the dataset."""
+    from schema import CODE, NAME
+
+    rows = df.dropna(subset=[CODE, NAME])
+    step = max(len(rows) // n, 1)
+    return [(str(name).strip(), str(code).strip()) for name, code in zip(rows[NAME][::step], rows[CODE][::step])][:n]
+
+
+def validate(service, queries: list[tuple[str, str]] | None = None) -> dict:
+    """Check document count and that sample searches find their company; raises RuntimeError."""
+    stats = service.sync_stats
+    expected = stats["upserted"] + stats["unchanged"]
+    count = len(service.vector_store.get(include=[])["ids"])
+    if count != expected:
+        raise RuntimeError(f"Snapshot holds {count} documents, expected {expected}")
+
+    queries = queries if queries is not None else sample_queries(service.df)
+    failed = []
+    for question, code in queries:
+        # Search path only (not the exact company lookup), so the vectors and BM25 are exercised
+        found = [d.metadata.get("company_code") for d in service.retriever.invoke(question)]
+        if code not in found:
+            failed.append(question)
+    if failed:
+        raise RuntimeError(f"Sample queries missed their company: {failed}")
+    return {"documents": count, "sample_queries": len(queries)}
+
+
+def build_snapshot(data_path: str = DEFAULT_PATH, root: str = SNAPSHOT_ROOT, promote_when_valid: bool = True,
+                   **service_kwargs) -> str:
+    """Build a new snapshot next to the live one and (if it validates) promote it.
+
+    The build starts from a copy of the current snapshot, so only changed rows are
+    re-embedded; the live snapshot is never written to.
+    """
+    from vector import RetrievalService
+
+    name = time.strftime("%Y%m%d-%H%M%S") + "-" + file_sha256(data_path)[:8]
+    path = os.path.join(root, name)
+    base = current_snapshot(root)
+    if base and os.path.isdir(base):
+        shutil.copytree(base, path, ignore=shutil.ignore_patterns(META_NAME))
+    else:
+        os.makedirs(path)
+    shutil.copy2(data_path, os.path.join(path, DATA_NAME))
+
+    service = RetrievalService(data_path=os.path.join(path, DATA_NAME), db_location=path,
+                               cache_dir=path, **service_kwargs)
+    service.warm(background=False)
+    report = validate(service)
+
+    with open(os.path.join(path, META_NAME), "w", encoding="utf-8") as f:
+        json.dump({
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "source": os.path.abspath(data_path),
+            "source_sha256": file_sha256(data_path),
+            "index_version": service.index_version,
+            "sync_stats": service.sync_stats,
+            "validation": report,
+        }, f, indent=2, default=str)
+    if promote_when_valid:
+        promote(name, root)
+    return name
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Manage blue/green index snapshots")
+    ap.add_argument("command", choices=["build", "list", "promote", "rollback", "prune"])
+    ap.add_argument("name", nargs="?", help="snapshot to promote")
+    ap.add_argument("--root", default=SNAPSHOT_ROOT)
+    ap.add_argument("--data", default=DEFAULT_PATH)
+    ap.add_argument("--keep", type=int, default=3)
+    ap.add_argument("--no-promote", action="store_true")
+    args = ap.parse_args()
+
+    if args.command == "build":
+        built = build_snapshot(args.data, args.root, promote_when_valid=not args.no_promote,
+                               progress=lambda done, total: print(f"[ingest] {done}/{total} documents embedded"))
+        print(f"[OK] Built snapshot {built}" + ("" if args.no_promote else " and made it current"))
+    elif args.command == "list":
+        current = read_pointer(args.root).get("current")
+        for name in list_snapshots(args.root):
+            print(("* " if name == current else "  ") + name)
+    elif args.command == "promote":
+        promote(args.name, args.root)
+        print(f"[OK] {args.name} is now current")
+    elif args.command == "rollback":
+        print(f"[OK] Rolled back to {rollback(args.root)}")
+    elif args.command == "prune":
+        removed = prune(args.root, args.keep)
+        print(f"[OK] Removed {len(removed)} snapshot(s): {', '.join(removed) or '-'}")
@@ -0,0 +1,198 @@
+# tracing.py
+# Per-request stage timings for the chat pipeline. Each question is one Trace whose
+# spans (retrieve, embed_query, answer_cache, format, llm, plot, ...) are timed with
+# `with span("stage"):` anywhere below it, including library code that never sees the
+# Trace object (it travels in a context variable). Finished traces are appended to a
+# JSONL file and folded into Prometheus histograms, rewritten as a text file that a
+# node_exporter textfile collector (or a human) can read; the last `window` traces
+# are kept in memory for rolling percentiles.
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+TRACE_DIR = "./.cache"
+TRACES_NAME = "traces.jsonl"
+PROMETHEUS_NAME = "fingenie.prom"
+# Seconds; embeddings / searches at the low end, whole LLM answers at the top
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current: contextvars.ContextVar["Trace | None"] = contextvars.ContextVar("trace", default=None)
+
+
+class Trace:
+    """Stage timings of one request. Spans may be added from any thread; repeated stages add up."""
+
+    def __init__(self, kind: str, **attrs):
+        self.kind = kind
+        self.attrs = attrs
+        self.started_at = time.time()
+        self.spans: dict[str, float] = {}
+        self.total: float | None = None
+        self.error: str | None = None
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def span(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def stream(self, stage: str, tokens):
+        """Pass `tokens` through, recording `<stage>.first_token` and the whole `<stage>`."""
+        start = time.perf_counter()
+        first = True
+        try:
+            for token in tokens:
+                if first:
+                    self.add(f"{stage}.first_token", time.perf_counter() - start)
+                    first = False
+                yield token
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def finish(self) -> None:
+        self.total = time.perf_counter() - self._start
+
+    def to_dict(self) -> dict:
+        return {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            "kind": self.kind,
+            **self.attrs,
+            "total_ms": round((self.total or 0.0) * 1000, 2),
+            "spans_ms": {stage: round(s * 1000, 2) for stage, s in self.spans.items()},
+            "error": self.error,
+        }
+
+
+def current() -> Trace | None:
+    return _current.get()
+
+
+@contextmanager
+def span(stage: str):
+    """Time a stage of the current trace; a no-op outside of one."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    with trace.span(stage):
+        yield
+
+
+class Tracer:
+    """Collects finished traces: JSONL log, Prometheus histograms, rolling window."""
+
+    def __init__(self, directory: str | None = TRACE_DIR, window: int = 200, buckets: tuple = BUCKETS):
+        self.directory = directory
+        self.buckets = buckets
+        self.recent: deque[Trace] = deque(maxlen=window)
+        self._counts: dict[tuple[str, str], list[int]] = {}  # (kind, stage) -> per-bucket counts (+Inf last)
+        self._sums: dict[tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def jsonl_path(self) -> str | None:
+        return os.path.join(self.directory, TRACES_NAME) if self.directory else None
+
+    @property
+    def prometheus_path(self) -> str | None:
+        return os.path.join(self.directory, PROMETHEUS_NAME) if self.directory else None
+
+    @contextmanager
+    def trace(self, kind: str, **attrs):
+        """Start a trace for one request; it is recorded when the block exits."""
+        trace = Trace(kind, **attrs)
+        token = _current.set(trace)
+        try:
+            yield trace
+        except BaseException as e:
+            trace.error = type(e).__name__
+            raise
+        finally:
+            _current.reset(token)
+            trace.finish()
+            self.record(trace)
+
+    def record(self, trace: Trace) -> None:
+        stages = dict(trace.spans, total=trace.total or 0.0)
+        with self._lock:
+            self.recent.append(trace)
+            for stage, seconds in stages.items():
+                key = (trace.kind, stage)
+                counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+                counts[int(np.searchsorted(self.buckets, seconds))] += 1
+                self._sums[key] = self._sums.get(key, 0.0) + seconds
+            if self.directory:
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(trace.to_dict(), default=str) + "\n")
+                tmp = self.prometheus_path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(self._prometheus())
+                os.replace(tmp, self.prometheus_path)
+
+    def percentiles(self, percentiles=(50, 95), kind: str | None = None) -> dict[str, dict[str, float]]:
+        """{stage: {"p50": ms, "p95": ms, "n": count}} over the rolling window."""
+        samples: dict[str, list[float]] = {}
+        with self._lock:
+            for trace in self.recent:
+                if kind is not None and trace.kind != kind:
+                    continue
+                for stage, seconds in dict(trace.spans, total=trace.total or 0.0).items():
+                    samples.setdefault(stage, []).append(seconds)
+        out = {}
+        for stage, values in samples.items():
+            row = {f"p{p}": float(v) * 1000 for p, v in zip(percentiles, np.percentile(values, percentiles))}
+            out[stage] = row | {"n": len(values)}
+        return out
+
+    def prometheus(self) -> str:
+        with self._lock:
+            return self._prometheus()
+
+    def _prometheus(self) -> str:
+        lines = [
+            "# HELP fingenie_stage_seconds Time spent per request stage.",
+            "# TYPE fingenie_stage_seconds histogram",
+        ]
+        for (kind, stage), counts in sorted(self._counts.items()):
+            labels = f'kind="{kind}",stage="{stage}"'
+            cumulative = 0
+            for bound, count in zip(list(self.buckets) + ["+Inf"], counts):
+                cumulative += count
+                lines.append(f'fingenie_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"fingenie_stage_seconds_sum{{{labels}}} {self._sums[(kind, stage)]:.6f}")
+            lines.append(f"fingenie_stage_seconds_count{{{labels}}} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def format_breakdown(trace: Trace) -> str:
+    """One line: `total 1234 ms = retrieve 80 · llm 1100 (first token 300) · ...`."""
+    spans = trace.spans
+    parts = []
+    for stage, seconds in spans.items():
+        if stage.endswith(".first_token"):
+            continue
+        part = f"{stage} {seconds * 1000:.0f}"
+        if f"{stage}.first_token" in spans:
+            part += f" (first token {spans[f'{stage}.first_token'] * 1000:.0f})"
+        parts.append(part)
+    return f"total {(trace.total or 0.0) * 1000:.0f} ms = " + " · ".join(parts)
+
+
+# Shared by app.py / main.py
+tracer = Tracer()
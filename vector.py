@@ -36,76 +36,471 @@
 #     search_kwargs={"k": 5}
 # )
 
-from langchain_ollama import OllamaEmbeddings
-from langchain_chroma import Chroma
-from langchain_core.documents import Document
+import functools
+import hashlib
 import os
+import threading
+import time
+
 import pandas as pd
 
-# Load dataset
-df = pd.read_excel("ragdata1.xlsx")
-
-# Embedding model
-embeddings = OllamaEmbeddings(model="mxbai-embed-large")
-
-# Persistent vector DB
-db_location = "./chroma_company_db"
-add_documents = not os.path.exists(db_location)
-
-if add_documents:
-    documents = []
-    ids = []
-
-    for i, row in df.iterrows():
-        # Convert row into a document
-        text_content = f"""
-        Company: {row['Company name']} (Code: {row['Company Code']})
-        Industry: {row['Industry Group']}
-        Description: {row['Company Description']}
-        Information: {row['Additional Information']}
-        Website: {row['Company Website']}
-        ASX: {row['Company page in ASX']}
-        Revenue (H1 2025) in AUD: {row['Half year ending June 2025 Revenue']}
-        Revenue (H1 2024) in AUD: {row['Half year ending June 2024 Revenue']}
-        Revenue Change: {row['Revenue Half year Percentage Change']}
-        Profit After Tax (H1 2025) in AUD: {row['Half year ending June 2025 Profit after tax attributable to shareholders (net earnings) in Mn']}
-        Profit After Tax (H1 2024) in AUD: {row['Half year ending June 2024 Profit after tax attributable to shareholders (net earnings) in Mn']}
-        Profit Change H1: {row['Profit after tax attributable to shareholders (net earnings) Percentage Change']}
-        Revenue (Full Year 2025): {row['Revenue for full year ending Jun 25 in mn in AUD']}       
-        Revenue (Full Year 2024): {row['Revenue for full year ending Jun 24 in mn in AUD']}
-        Revenue Change Full Year: {row['Revenue for full year percentage change']}
-        Profit After Tax (Full Year 2025) in AUD: {row['Full year ending June 2025 Profit after tax attributable to shareholders (net earnings) in Mn']}
-        Profit After Tax (Full Year 2025) in AUD: {row['Full year ending June 2024 Profit after tax attributable to shareholders (net earnings) in Mn']}
-        Profit Change Full Year: {row['Full year ending June 2024 Profit after tax attributable to shareholders percentage change']}
-        Equity: {row['Equity for shareholder in Mn AUD']}
-        Shares: {row['Number of Shares in Millions']}
-        Market price: {row['Market Price in AUD on 15th Sep  2025']}
-        EPS (H1 2025): {row['Earnings per Share (AUD) for half year ending June 2025 (Net Profit attributable to share holder) divided by Number of shares']}
-        EPS (H1 2024): {row['Earnings per Share (AUD) for half year ending June 2024 (Net Profit attributable to share holder) divided by Number of shares. EPS measures how much profit a company generates for each outstanding share of its stock. Interpretation: A higher EPS generally means the company is more profitable on a per-share basis, which is positive for shareholders. ']}
-        Price-to-Earnings (P/E, H1 2024): {row['Price to Earnings ratio (x) for half year ending June 2025 : Market price divided by Earnings per share. The PE ratio shows how much investors are willing to pay for each dollar of the companys earnings. It compares the companys share price with its earnings per share. Interpretation: A high P/E ratio suggests the market expects strong future growth (but it could also mean the stock is overpriced). A low PE ratio may indicate undervaluation or slower growth expectations. ']}
-        Book Value per Share (BVPS): {row['Book value per share (AUD): Equity for shareholder/Number of shares. Book Value per Share (BVPS) is a financial ratio that represents the net asset value of a company available to each outstanding share of common stock. BVPS shows the accounting value of each share if the company were liquidated today, based on its historical cost of assets and liabilities. Comparison with Market Price: Market Price per Share > BVPS: Investors believe the company has strong future earnings power, intangible assets (brand, patents, goodwill), or growth potential not fully reflected on the balance sheet. Market Price per Share < BVPS: Could indicate the stock is undervalued, or it may signal concerns about profitability, asset quality, or growth. Indicator of Financial Strength: A higher BVPS over time suggests the company is consistently building value for shareholders (through retained earnings, reinvestments). A declining BVPS could mean losses, high dividend payouts, or write-downs of assets.']}
-        Price-to-Book Ratio (P/B): {row['Price to Book value (x): Market price/Book value per share: It shows how much investors are willing to pay for each $1 of book value (net assets) of the company.']}
-        """
-        document = Document(
-            page_content=text_content.strip(),
-            metadata={"company_code": row["Company Code"], "industry": row["Industry Group"]},
-            id=str(i)
-        )
-        ids.append(str(i))
-        documents.append(document)
-
-# Create / load Chroma DB
-vector_store = Chroma(
-    collection_name="company_financials",
-    persist_directory=db_location,
-    embedding_function=embeddings
+from dataset import CACHE_DIR, load_dataset
+from entity_linker import CompanyLinker, IndustryLinker
+from filters import build_filter
+from ingest import (
+    MANIFEST_NAME, build_documents, build_lexical_index, build_period_documents, manifest_version, sync_index,
 )
+from lexical import LEXICAL_NAME, BM25Index, HybridRetriever
+from partitions import PartitionedRetriever, PartitionedStore, _Once, partition_documents, question_periods
+from schema import PERIOD_FIELDS, PROFILE
+from snapshots import DATA_NAME, POINTER_NAME, SNAPSHOT_ROOT, read_pointer
+import tracing
+
+
+def _record_k(docs: list, max_k: int) -> list:
+    """Note how many documents were returned (the adaptive k) on the current trace."""
+    trace = tracing.current()
+    if trace is not None:
+        trace.attrs.update(k=len(docs), max_k=max_k)
+    return docs
+
+
+@functools.lru_cache(maxsize=None)
+def _chroma_class():
+    """Chroma plus the `upsert_embeddings` hook ingest.sync_index writes precomputed vectors through."""
+    from langchain_chroma import Chroma
+
+    class ChromaStore(Chroma):
+        def upsert_embeddings(self, ids: list[str], embeddings, texts: list[str], metadatas: list[dict]) -> None:
+            # Chroma.add_texts would embed the texts again, so this is the one place that writes
+            # to the private `_collection` (checked against langchain-chroma 1.1.0)
+            self._collection.upsert(ids=ids, embeddings=embeddings, documents=texts, metadatas=metadatas)
+
+    return ChromaStore
+
+
+class RetrievalService:
+    """Lazily loads the dataset, embeddings and Chroma collection on first use.
+
+    Nothing heavy happens at import time. Call `warm(background=True)` to start
+    loading in a thread; `status()` reports readiness and per-stage timings.
+    `backend="flat"` swaps Chroma for the memory-mapped FlatVectorStore (give it
+    its own `db_location`). `partition_by="period"` (or `"industry"`) indexes one
+    document per company per period into separate partitions and fans searches
+    out to the relevant ones (see partitions.py). `progress(done, total)` is
+    called while changed documents are embedded; nothing is printed otherwise.
+
+    With `snapshot_root`, the data and index come from the snapshot CURRENT.json
+    points at (see snapshots.py), falling back to `data_path` / `db_location`
+    until one is promoted. The pointer is re-checked at most every
+    `reload_interval` seconds; a new snapshot is loaded in a background thread and
+    swapped in once ready, so requests never wait on it.
+    """
+
+    def __init__(
+        self,
+        data_path: str = "ragdata1.xlsx",
+        db_location: str = "./chroma_company_db",
+        collection_name: str = "company_financials",
+        embed_model: str = "mxbai-embed-large",
+        backend: str = "chroma",
+        flat_dtype: str = "float16",
+        partition_by: str | None = None,
+        k: int = 5,
+        adaptive: bool = True,
+        min_k: int = 2,
+        skip_dense_ratio: float | None = 3.0,
+        batch_size: int = 32,
+        max_workers: int = 4,
+        cache_dir: str = CACHE_DIR,
+        snapshot_root: str | None = None,
+        reload_interval: float = 5.0,
+        progress=None,
+    ):
+        self.data_path = data_path
+        self.db_location = db_location
+        self.cache_dir = cache_dir
+        self.snapshot_root = snapshot_root
+        self.reload_interval = reload_interval
+        self.collection_name = collection_name
+        self.embed_model = embed_model
+        self.backend = backend
+        self.flat_dtype = flat_dtype
+        self.partition_by = partition_by
+        self.k = k
+        self.adaptive = adaptive
+        self.min_k = min_k
+        self.skip_dense_ratio = skip_dense_ratio
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.progress = progress
+
+        self.timings: dict[str, float] = {}
+        self.sync_stats: dict | None = None
+        self.index_version: str | None = None
+        self.error: Exception | None = None
+        self._df = None
+        self._linker = None
+        self._industry_linker = None
+        self._embeddings = None
+        self._vector_store = None
+        self._lexical = None
+        self._retriever = None
+        self._data_lock = threading.Lock()
+        self._store_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+        self.snapshot: str | None = None
+        self._pointer_mtime: float | None = None
+        self._next_check = 0.0
+        self._swap_thread: threading.Thread | None = None
+        self._resolve_snapshot()
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.db_location, MANIFEST_NAME)
+
+    @property
+    def lexical_path(self) -> str:
+        return os.path.join(self.db_location, LEXICAL_NAME)
+
+    # ---------------- Snapshots ----------------
+    def _pointer_state(self) -> tuple[float | None, str | None]:
+        path = os.path.join(self.snapshot_root, POINTER_NAME)
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return None, None
+        return mtime, read_pointer(self.snapshot_root).get("current")
+
+    def _resolve_snapshot(self) -> None:
+        if not self.snapshot_root:
+            return
+        self._pointer_mtime, name = self._pointer_state()
+        if name:
+            self._use_snapshot(name)
+
+    def _use_snapshot(self, name: str) -> None:
+        path = os.path.join(self.snapshot_root, name)
+        self.snapshot = name
+        self.db_location = path
+        self.data_path = os.path.join(path, DATA_NAME)
+        self.cache_dir = path
+
+    def check_for_update(self) -> bool:
+        """Start loading a newly promoted snapshot in the background; True if one was found."""
+        if not self.snapshot_root or time.monotonic() < self._next_check:
+            return False
+        self._next_check = time.monotonic() + self.reload_interval
+        mtime, name = self._pointer_state()
+        if mtime == self._pointer_mtime or not name or name == self.snapshot:
+            self._pointer_mtime = mtime
+            return False
+        if self._swap_thread is not None and self._swap_thread.is_alive():
+            return False
+        self._pointer_mtime = mtime
+        self._swap_thread = threading.Thread(target=self._swap_to, args=(name,), name="snapshot-swap", daemon=True)
+        self._swap_thread.start()
+        return True
+
+    def _swap_to(self, name: str) -> None:
+        fresh = RetrievalService(
+            collection_name=self.collection_name, embed_model=self.embed_model, backend=self.backend,
+            flat_dtype=self.flat_dtype, partition_by=self.partition_by, k=self.k, adaptive=self.adaptive,
+            min_k=self.min_k, skip_dense_ratio=self.skip_dense_ratio, batch_size=self.batch_size,
+            max_workers=self.max_workers, progress=self.progress,
+        )
+        fresh.snapshot_root = self.snapshot_root
+        fresh._use_snapshot(name)
+        try:
+            fresh.warm(background=False)
+        except Exception as e:
+            self.error = e  # keep serving the current snapshot
+            return
+        # Plain reference swaps: in-flight requests finish on the objects they already hold
+        with self._store_lock, self._data_lock:
+            self._use_snapshot(name)
+            self._df = fresh._df
+            self._linker = None
+            self._industry_linker = None
+            self._embeddings = fresh._embeddings
+            self._vector_store = fresh._vector_store
+            self._lexical = fresh._lexical
+            self._retriever = fresh._retriever
+            self.sync_stats = fresh.sync_stats
+            self.index_version = fresh.index_version
+            self.timings = fresh.timings
+            self.error = None
+
+    # ---------------- Loading stages ----------------
+    def _timed(self, stage: str, fn):
+        start = time.perf_counter()
+        result = fn()
+        self.timings[stage] = time.perf_counter() - start
+        return result
+
+    def _load_df(self) -> pd.DataFrame:
+        with self._data_lock:
+            if self._df is None:
+                self._df = self._timed("load_data", lambda: load_dataset(self.data_path, self.cache_dir))
+            return self._df
+
+    def _load_store(self):
+        with self._store_lock:
+            if self._retriever is not None:
+                return
+            try:
+                df = self._load_df()
+                self._embeddings = self._timed("embeddings", self._make_embeddings)
+                if self.partition_by:
+                    self._timed("sync_index", lambda: self._load_partitions(df))
+                else:
+                    self._vector_store = self._timed("open_store", self._open_store)
+                    documents = build_documents(df)
+                    self.sync_stats = self._timed("sync_index", lambda: self._sync(
+                        self._vector_store, documents, self.manifest_path))
+                    self.index_version = manifest_version(self.manifest_path)
+                    self._lexical = self._timed("lexical_index", lambda: self._load_lexical(
+                        documents, self.lexical_path, self.sync_stats))
+                    self._retriever = self._hybrid(self._vector_store, self._lexical)
+                self.error = None
+            except Exception as e:
+                self.error = e
+                raise
+
+    def _sync(self, store, documents, manifest_path: str) -> dict:
+        # Only re-embed rows whose content changed since the last run
+        return sync_index(
+            store,
+            self._embeddings,
+            documents,
+            manifest_path,
+            batch_size=self.batch_size,
+            max_workers=self.max_workers,
+            progress=self.progress,
+        )
+
+    def _hybrid(self, store, lexical) -> HybridRetriever:
+        return HybridRetriever(
+            vector_store=store,
+            lexical=lexical,
+            k=self.k,
+            adaptive=self.adaptive,
+            min_k=self.min_k,
+            skip_dense_ratio=self.skip_dense_ratio,
+        )
+
+    def _load_partitions(self, df: pd.DataFrame) -> None:
+        """Sync each partition on its own; unchanged partitions cost a manifest diff."""
+        partitions = partition_documents(build_period_documents(df), self.partition_by)
+        stores, retrievers, stats, versions = {}, {}, {}, []
+        for key, documents in sorted(partitions.items()):
+            location = os.path.join(self.db_location, "partitions", key)
+            manifest_path = os.path.join(location, MANIFEST_NAME)
+            stores[key] = self._open_store(location, f"{self.collection_name}__{key}")
+            stats[key] = self._sync(stores[key], documents, manifest_path)
+            lexical = self._load_lexical(documents, os.path.join(location, LEXICAL_NAME), stats[key])
+            retrievers[key] = self._hybrid(stores[key], lexical)
+            versions.append(f"{key}={manifest_version(manifest_path)}")
+
+        self.sync_stats = {field: sum(s[field] for s in stats.values()) for field in ("upserted", "deleted", "unchanged")}
+        self.sync_stats["partitions"] = stats
+        self.index_version = hashlib.sha256(";".join(versions).encode()).hexdigest()[:16]
+        self._vector_store = PartitionedStore(stores)
+        self._retriever = PartitionedRetriever(
+            partitions=retrievers, by=self.partition_by, embeddings=self._embeddings, k=self.k)
+
+    @staticmethod
+    def _load_lexical(documents, path: str, stats: dict) -> BM25Index:
+        changed = stats["upserted"] or stats["deleted"]
+        if changed or not os.path.exists(path):
+            return build_lexical_index(documents, path)
+        return BM25Index.load(path)
+
+    def _make_embeddings(self):
+        # Imported here so `import vector` stays cheap
+        from langchain_ollama import OllamaEmbeddings
+        from embedding_cache import CachedEmbeddings
+
+        # Wrapped in an on-disk cache shared by ingest, retrieval and eval
+        return CachedEmbeddings(OllamaEmbeddings(model=self.embed_model))
+
+    def _open_store(self, location: str | None = None, collection_name: str | None = None):
+        if self.backend == "flat":
+            from flat_index import FlatVectorStore
+
+            return FlatVectorStore(location or self.db_location, self._embeddings, dtype=self.flat_dtype)
+
+        # Partitions are separate collections in the shared Chroma directory
+        return _chroma_class()(
+            collection_name=collection_name or self.collection_name,
+            persist_directory=self.db_location,
+            embedding_function=self._embeddings,
+        )
+
+    # ---------------- Public API ----------------
+    def warm(self, background: bool = True) -> None:
+        """Start loading everything; returns immediately when `background` is set."""
+        if self.ready:
+            return
+        if not background:
+            self._load_store()
+            return
+        if self._thread is None or not self._thread.is_alive():
+            def run():
+                try:
+                    self._load_store()
+                except Exception:
+                    pass  # kept on self.error for status()
+            self._thread = threading.Thread(target=run, name="retrieval-warmup", daemon=True)
+            self._thread.start()
+
+    @property
+    def ready(self) -> bool:
+        return self._retriever is not None
+
+    def status(self) -> dict:
+        self.check_for_update()
+        return {
+            "ready": self.ready,
+            "error": repr(self.error) if self.error else None,
+            "timings": dict(self.timings),
+            "sync_stats": self.sync_stats,
+            "index_version": self.index_version,
+            "snapshot": self.snapshot,
+        }
+
+    @property
+    def df(self) -> pd.DataFrame:
+        # The DataFrame does not need the vector store, so it loads on its own
+        return self._load_df()
+
+    @property
+    def embeddings(self):
+        self._load_store()
+        return self._embeddings
+
+    @property
+    def vector_store(self):
+        self._load_store()
+        return self._vector_store
+
+    @property
+    def retriever(self):
+        self._load_store()
+        return self._retriever
+
+    @property
+    def linker(self) -> CompanyLinker:
+        if self._linker is None:
+            self._linker = CompanyLinker(self.df)
+        return self._linker
+
+    @property
+    def industry_linker(self) -> IndustryLinker:
+        if self._industry_linker is None:
+            self._industry_linker = IndustryLinker(self.df)
+        return self._industry_linker
+
+    @property
+    def industries(self) -> list[str]:
+        """Cleaned industry names, as stored in the `industry` metadata."""
+        return list(self.industry_linker.industries)
+
+    def get_by_codes(self, codes: list, industries: list | None = None, periods: list | None = None,
+                     k: int | None = None) -> list:
+        """Fetch company documents directly by `company_code` metadata (no embedding call).
+
+        With `partition_by`, each company has one document per period: documents of
+        the given `periods` come first, then the others in `PERIOD_FIELDS` order and the
+        profile, each period across all `codes` before the next. At most `k` are returned.
+        """
+        from langchain_core.documents import Document
+
+        if not codes:
+            return []
+        found = self.vector_store.get(where=build_filter(industries, codes))
+        docs = [
+            Document(page_content=text, metadata=meta or {}, id=doc_id)
+            for doc_id, text, meta in zip(found["ids"], found["documents"], found["metadatas"])
+        ]
+        order = {code: i for i, code in enumerate(codes)}
+        rank = {period: i for i, period in enumerate(dict.fromkeys([*(periods or []), *PERIOD_FIELDS, PROFILE]))}
+        docs.sort(key=lambda d: (rank.get(d.metadata.get("period"), len(rank)),
+                                 order.get(d.metadata.get("company_code"), len(order))))
+        return docs[:k] if k else docs
+
+    def retrieve(self, question: str, k: int | None = None, adaptive: bool | None = None,
+                 industries: list | None = None, codes: list | None = None, auto_filter: bool = True) -> list:
+        """Exact lookup for companies named in the question, then hybrid search for the rest.
+
+        Documents of linked companies come first; the remaining slots up to `k` are
+        filled from hybrid search (e.g. a company the linker missed in "Coles vs
+        Woolworths"), then with the linked companies' documents for periods the
+        question doesn't name. With `adaptive`, fewer search results are kept when relevance
+        drops off sharply. `industries` / `codes` (e.g. from the UI) restrict the
+        search; with `auto_filter`, industries named in the question ("REITs with
+        rising revenue") do the same. An automatic filter that matches nothing falls
+        back to the unfiltered search.
+        """
+        self.check_for_update()
+        k = k or self.k
+        with tracing.span("link"):
+            linked = self.linker.link(question)
+        if codes:
+            linked = [c for c in linked if c in codes]
+        docs, other_periods = [], []
+        if linked:
+            periods = question_periods(question) if self.partition_by else None
+            with tracing.span("lookup"):
+                docs = self.get_by_codes(linked[:k], industries, periods, k=k)
+            if periods:
+                other_periods = [doc for doc in docs if doc.metadata.get("period") not in periods]
+                docs = [doc for doc in docs if doc.metadata.get("period") in periods]
+            if len(docs) >= k:
+                return _record_k(docs, k)
+
+        auto = []
+        if auto_filter and not industries:
+            auto = self.industry_linker.link(question)
+        where = build_filter(industries or auto, codes)
+        embed = _Once(self._traced_embedding(question))  # at most once, even with the fallback below
+        with tracing.span("search"):
+            found = self.retriever.invoke(question, k=k, adaptive=adaptive, filter=where, query_embedding=embed)
+            if not found and auto:
+                found = self.retriever.invoke(question, k=k, adaptive=adaptive, filter=build_filter(None, codes),
+                                              query_embedding=embed)
+        seen = {doc.id for doc in docs}
+        docs += [doc for doc in found if doc.id not in seen][:k - len(docs)]
+        docs += other_periods[:k - len(docs)]
+        return _record_k(docs, k)
+
+    def _traced_embedding(self, question: str):
+        # Called from the retriever's worker threads, so the trace is captured here
+        trace = tracing.current()
+
+        def embed():
+            start = time.perf_counter()
+            vector = self.embeddings.embed_query(question)
+            if trace is not None:
+                trace.add("embed_query", time.perf_counter() - start)
+            return vector
+        return embed
+
+    def invoke(self, question: str):
+        return self.retrieve(question)
+
+
+# Shared instance; nothing is loaded until it is first used or warmed
+service = RetrievalService(snapshot_root=SNAPSHOT_ROOT)
+
 
-if add_documents:
-    vector_store.add_documents(documents=documents, ids=ids)
+def __getattr__(name):
+    # Backwards compatible `from vector import retriever, df`, resolved lazily
+    if name in ("retriever", "df", "embeddings", "vector_store"):
+        return getattr(service, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Retriever with top-k docs
-retriever = vector_store.as_retriever(search_kwargs={"k": 5})
 
-# Export retriever + dataframe
-__all__ = ["retriever", "df"]
\ No newline at end of file
+# Export retrieval service (+ lazy retriever / dataframe)
+__all__ = ["RetrievalService", "service", "retriever", "df", "embeddings"]